@@ -0,0 +1,348 @@
+# backend/app/analytics.py
+import os
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Patient, SelfReport
+
+# How long a snapshot is served before the next query pulls new rows in.
+REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "30"))
+
+# Rows fetched per round trip while loading a snapshot.
+LOAD_BATCH_SIZE = int(os.getenv("ANALYTICS_LOAD_BATCH_SIZE", "5000"))
+
+# Ids below the high-water mark that are re-read on every refresh. A report
+# whose transaction commits after a higher id is already visible (or that
+# reaches a lagging replica late) is picked up as long as it falls in here.
+REPORT_OVERLAP = int(os.getenv("ANALYTICS_REPORT_OVERLAP", "1000"))
+
+# Same for patients, whose updated_at is stamped before their transaction
+# commits: rows updated this many seconds before the high-water mark are
+# re-read on every refresh.
+PATIENT_OVERLAP_SECONDS = float(os.getenv("ANALYTICS_PATIENT_OVERLAP_SECONDS", "300"))
+
+SEVERE_THRESHOLD = 4
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+def _epoch_seconds(values):
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+class _Vocab:
+    """Maps strings (symptom names, genders) to dense integer codes."""
+
+    def __init__(self):
+        self.names = []
+        self._codes = {}
+
+    def encode(self, name) -> int:
+        if name is None:
+            return -1
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self._codes[name] = code
+            self.names.append(name)
+        return code
+
+    def decode(self, code: int):
+        return self.names[code] if code >= 0 else None
+
+
+# ============================================================
+# Columnar snapshot of patients + self-reports
+# ============================================================
+
+class CohortSnapshot:
+    """
+    In-memory, column-per-field copy of the cohort data.
+
+    Self-reports are append-only, so they are pulled in by id above the
+    report high-water mark, minus a REPORT_OVERLAP window re-read to catch
+    ids that committed out of order. Patients can be edited (age, gender), so they
+    are pulled in by updated_at (minus PATIENT_OVERLAP_SECONDS) and overwritten
+    in place; a patient referenced by a loaded report but still unknown is
+    fetched by id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.symptoms = _Vocab()
+        self.genders = _Vocab()
+        self._reset()
+
+    def _reset(self):
+        # patients (one row per patient)
+        self.patient_id = np.empty(0, dtype=np.int64)
+        self.patient_age = np.empty(0, dtype=np.int64)       # -1 = unknown
+        self.patient_gender = np.empty(0, dtype=np.int64)    # -1 = unknown
+        self.patient_enrolled = np.empty(0, dtype=np.int64)  # epoch seconds
+        self._patient_row = {}
+
+        # self-reports (one row per report)
+        self.report_id = np.empty(0, dtype=np.int64)
+        self.report_patient_id = np.empty(0, dtype=np.int64)
+        self.report_created = np.empty(0, dtype=np.int64)
+        self.report_compliant = np.empty(0, dtype=np.int8)   # -1 = unknown
+
+        # symptoms (one row per symptom entry, pointing at its report row)
+        self.symptom_report = np.empty(0, dtype=np.int64)
+        self.symptom_code = np.empty(0, dtype=np.int64)
+        self.symptom_severity = np.empty(0, dtype=np.int64)
+
+        self.report_hwm = 0
+        self.patient_hwm = None
+        self.refreshed_at = 0.0
+
+    # --------------------------------------------------------
+    # Loading
+    # --------------------------------------------------------
+
+    def refresh(self, db: Session, force: bool = False):
+        if not force and time.monotonic() - self.refreshed_at < REFRESH_SECONDS:
+            return self
+        with self._lock:
+            if force or time.monotonic() - self.refreshed_at >= REFRESH_SECONDS:
+                self._load_patients(db)
+                self._load_reports(db)
+                self._load_missing_patients(db)
+                self.refreshed_at = time.monotonic()
+        return self
+
+    def invalidate(self):
+        """Drop everything; the next refresh reloads from scratch."""
+        with self._lock:
+            self._reset()
+
+    def _patient_query(self):
+        return select(
+            Patient.id, Patient.age, Patient.gender,
+            Patient.created_at, Patient.updated_at,
+        ).order_by(Patient.updated_at, Patient.id)
+
+    def _load_patients(self, db: Session):
+        stmt = self._patient_query()
+        # reloading rows in the overlap is harmless since they overwrite in place
+        if self.patient_hwm is not None:
+            since = self.patient_hwm - timedelta(seconds=PATIENT_OVERLAP_SECONDS)
+            stmt = stmt.where(Patient.updated_at >= since)
+        rows = db.execute(stmt).all()
+        if rows:
+            self._upsert_patients(rows)
+            self.patient_hwm = max(self.patient_hwm or rows[-1].updated_at, rows[-1].updated_at)
+
+    def _load_missing_patients(self, db: Session):
+        """Patients of loaded reports that the updated_at scan hasn't seen."""
+        missing = set(self.report_patient_id.tolist()) - self._patient_row.keys()
+        if missing:
+            rows = db.execute(self._patient_query().where(Patient.id.in_(missing))).all()
+            if rows:
+                self._upsert_patients(rows)
+
+    def _upsert_patients(self, rows):
+
+        ids = np.array([r.id for r in rows], dtype=np.int64)
+        ages = np.array([-1 if r.age is None else r.age for r in rows], dtype=np.int64)
+        genders = np.array([self.genders.encode(r.gender) for r in rows], dtype=np.int64)
+        enrolled = _epoch_seconds([r.created_at for r in rows])
+
+        known = np.array([i in self._patient_row for i in ids.tolist()], dtype=bool)
+        if known.any():
+            rows_idx = np.array([self._patient_row[i] for i in ids[known].tolist()], dtype=np.int64)
+            self.patient_age[rows_idx] = ages[known]
+            self.patient_gender[rows_idx] = genders[known]
+            self.patient_enrolled[rows_idx] = enrolled[known]
+
+        new = ~known
+        start = len(self.patient_id)
+        for offset, pid in enumerate(ids[new].tolist()):
+            self._patient_row[pid] = start + offset
+        self.patient_id = np.concatenate([self.patient_id, ids[new]])
+        self.patient_age = np.concatenate([self.patient_age, ages[new]])
+        self.patient_gender = np.concatenate([self.patient_gender, genders[new]])
+        self.patient_enrolled = np.concatenate([self.patient_enrolled, enrolled[new]])
+
+    def _load_reports(self, db: Session):
+        cursor = max(self.report_hwm - REPORT_OVERLAP, 0)
+        loaded = set(self.report_id[self.report_id > cursor].tolist())
+        while True:
+            stmt = (
+                select(
+                    SelfReport.id, SelfReport.patient_id, SelfReport.created_at,
+                    SelfReport.medication_compliance, SelfReport.symptoms,
+                )
+                .where(SelfReport.id > cursor)
+                .order_by(SelfReport.id)
+                .limit(LOAD_BATCH_SIZE)
+            )
+            batch = db.execute(stmt).all()
+            if not batch:
+                return
+            cursor = batch[-1].id
+            self.report_hwm = max(self.report_hwm, cursor)
+
+            rows = [r for r in batch if r.id not in loaded]
+            if rows:
+                self._append_reports(rows)
+            if len(batch) < LOAD_BATCH_SIZE:
+                return
+
+    def _append_reports(self, rows):
+        base = len(self.report_patient_id)
+        sym_report, sym_code, sym_severity = [], [], []
+        for offset, r in enumerate(rows):
+            for s in r.symptoms or []:
+                sym_report.append(base + offset)
+                sym_code.append(self.symptoms.encode(s.get("symptom")))
+                sym_severity.append(int(s.get("severity", 0)))
+
+        compliant = [
+            -1 if r.medication_compliance is None else int(r.medication_compliance)
+            for r in rows
+        ]
+        self.report_id = np.concatenate([
+            self.report_id, np.array([r.id for r in rows], dtype=np.int64),
+        ])
+        self.report_patient_id = np.concatenate([
+            self.report_patient_id,
+            np.array([r.patient_id for r in rows], dtype=np.int64),
+        ])
+        self.report_created = np.concatenate([
+            self.report_created, _epoch_seconds([r.created_at for r in rows]),
+        ])
+        self.report_compliant = np.concatenate([
+            self.report_compliant, np.array(compliant, dtype=np.int8),
+        ])
+        self.symptom_report = np.concatenate([
+            self.symptom_report, np.array(sym_report, dtype=np.int64),
+        ])
+        self.symptom_code = np.concatenate([
+            self.symptom_code, np.array(sym_code, dtype=np.int64),
+        ])
+        self.symptom_severity = np.concatenate([
+            self.symptom_severity, np.array(sym_severity, dtype=np.int64),
+        ])
+
+    # --------------------------------------------------------
+    # Helpers
+    # --------------------------------------------------------
+
+    def _report_patient_row(self):
+        """Patient row for every report (-1 if the patient isn't loaded yet)."""
+        if len(self.patient_id) == 0:
+            return np.full(len(self.report_patient_id), -1, dtype=np.int64)
+        lookup = np.full(int(self.patient_id.max()) + 1, -1, dtype=np.int64)
+        lookup[self.patient_id] = np.arange(len(self.patient_id))
+        pid = self.report_patient_id
+        in_range = pid < len(lookup)
+        rows = np.full(len(pid), -1, dtype=np.int64)
+        rows[in_range] = lookup[pid[in_range]]
+        return rows
+
+    # --------------------------------------------------------
+    # Queries
+    # --------------------------------------------------------
+
+    def adherence_by_week(self):
+        """Adherence rate per study week (weeks since the patient enrolled)."""
+        with self._lock:
+            return self._adherence_by_week()
+
+    def _adherence_by_week(self):
+        patient_row = self._report_patient_row()
+        ok = patient_row >= 0
+        elapsed = self.report_created[ok] - self.patient_enrolled[patient_row[ok]]
+        week = np.maximum(elapsed // SECONDS_PER_WEEK, 0)
+        if len(week) == 0:
+            return []
+
+        total = np.bincount(week)
+        compliant = np.bincount(week, weights=(self.report_compliant[ok] == 1))
+        weeks = np.nonzero(total)[0]
+        return [
+            {
+                "week": int(w),
+                "total": int(total[w]),
+                "compliant": int(compliant[w]),
+                "rate": float(compliant[w] / total[w]),
+            }
+            for w in weeks
+        ]
+
+    def severity_histogram(self, age_band: int = 10):
+        """Symptom counts per (age band, gender, severity)."""
+        with self._lock:
+            return self._severity_histogram(age_band)
+
+    def _severity_histogram(self, age_band: int):
+        patient_row = self._report_patient_row()[self.symptom_report]
+        ok = patient_row >= 0
+        if not ok.any():
+            return []
+
+        prow = patient_row[ok]
+        age = self.patient_age[prow]
+        band = np.where(age >= 0, age // age_band, -1)
+        gender = self.patient_gender[prow]
+        severity = self.symptom_severity[ok]
+
+        keys, counts = np.unique(
+            np.stack([band, gender, severity], axis=1), axis=0, return_counts=True,
+        )
+        return [
+            {
+                "age_band": f"{b * age_band}-{b * age_band + age_band - 1}" if b >= 0 else None,
+                "gender": self.genders.decode(int(g)),
+                "severity": int(s),
+                "count": int(c),
+            }
+            for (b, g, s), c in zip(keys.tolist(), counts.tolist())
+        ]
+
+    def time_to_first_severe(self, threshold: int = SEVERE_THRESHOLD):
+        """Days from enrollment to each patient's first severe symptom."""
+        with self._lock:
+            return self._time_to_first_severe(threshold)
+
+    def _time_to_first_severe(self, threshold: int):
+        n_patients = len(self.patient_id)
+        report_row = self._report_patient_row()
+
+        severe = self.symptom_severity >= threshold
+        sev_reports = self.symptom_report[severe]
+        prow = report_row[sev_reports]
+        ok = prow >= 0
+        prow = prow[ok]
+        ts = self.report_created[sev_reports[ok]]
+
+        first = np.full(n_patients, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first, prow, ts)
+        had_event = first != np.iinfo(np.int64).max
+        days = np.maximum(first[had_event] - self.patient_enrolled[had_event], 0) / SECONDS_PER_DAY
+
+        day_bins = np.bincount(days.astype(np.int64)) if len(days) else np.empty(0, dtype=np.int64)
+        return {
+            "patients": int(n_patients),
+            "patients_with_event": int(had_event.sum()),
+            "median_days": float(np.median(days)) if len(days) else None,
+            "mean_days": float(days.mean()) if len(days) else None,
+            "items": [
+                {"day": int(d), "events": int(day_bins[d])}
+                for d in np.nonzero(day_bins)[0]
+            ],
+        }
+
+
+_snapshot = CohortSnapshot()
+
+
+def get_cohort_snapshot(db: Session) -> CohortSnapshot:
+    return _snapshot.refresh(db)
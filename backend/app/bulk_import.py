@@ -0,0 +1,342 @@
+# backend/app/bulk_import.py
+"""
+Bulk patient onboarding from a CSV or NDJSON stream.
+
+Each row has `wallet_address`, `age`, `gender` and optionally `record_file`
+(a member of an accompanying zip archive) and `tx_hash` (the on-chain
+uploadData transaction for that record). Rows are processed in batches: study
+IDs for new wallets are reserved in one round trip, record files are hashed
+and stored by a worker pool, and the batch is upserted with a single
+multi-row INSERT ... ON CONFLICT.
+
+    python -m app.bulk_import cohort.csv --records records.zip
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import case, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Patient
+from app.study_ids import allocate_study_ids
+
+BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "500"))
+WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", "4"))
+
+UPLOAD_DIR = "uploads"
+UPLOAD_URL = "http://127.0.0.1:8000/uploads"
+
+
+# ============================================================
+# Input parsing
+# ============================================================
+
+def detect_format(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return "csv"
+
+
+def iter_rows(stream, fmt: str):
+    """Yield (line_number, dict) from a binary CSV/NDJSON stream."""
+    # utf-8-sig: Excel's "CSV UTF-8" export starts with a byte-order mark
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "ndjson":
+        for n, line in enumerate(text_stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield n, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield n, {"_error": f"invalid JSON: {e}"}
+    else:
+        # line 1 is the header
+        for n, row in enumerate(csv.DictReader(text_stream), start=2):
+            yield n, row
+
+
+def _text(row: dict, key: str):
+    value = row.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"invalid {key}: {value!r}")
+    return value.strip() or None
+
+
+def _clean(row) -> dict:
+    if not isinstance(row, dict):
+        raise ValueError("row must be a JSON object")
+    if "_error" in row:
+        raise ValueError(row["_error"])
+
+    wallet = _text(row, "wallet_address")
+    if not wallet:
+        raise ValueError("wallet_address required")
+    # used in the stored record's filename
+    if "/" in wallet or "\\" in wallet:
+        raise ValueError(f"invalid wallet_address: {wallet!r}")
+
+    age = row.get("age")
+    if age in (None, ""):
+        age = None
+    else:
+        try:
+            age = int(age)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid age: {age!r}")
+
+    return {
+        "wallet_address": wallet,
+        "age": age,
+        "gender": _text(row, "gender"),
+        "record_file": _text(row, "record_file"),
+        "tx_hash": _text(row, "tx_hash"),
+    }
+
+
+# ============================================================
+# Record files
+# ============================================================
+
+def _store_record(records: zipfile.ZipFile, wallet: str, member: str):
+    """
+    Write the record under a temporary name; it replaces any existing record
+    for `wallet` only once the batch is committed (see _publish_records).
+    Returns (temp path, url, sha256).
+    """
+    data = records.read(member)
+
+    filename = f"{wallet}_initial_record.pdf"
+    tmp = os.path.join(UPLOAD_DIR, f".{filename}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+    except OSError:
+        _discard(tmp)
+        raise
+
+    return tmp, f"{UPLOAD_URL}/{filename}", hashlib.sha256(data).hexdigest()
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _publish_records(rows: list):
+    for _, row in rows:
+        if row.get("record_tmp"):
+            filename = f"{row['wallet_address']}_initial_record.pdf"
+            os.replace(row["record_tmp"], os.path.join(UPLOAD_DIR, filename))
+
+
+def _discard_records(rows: list):
+    for _, row in rows:
+        if row.get("record_tmp"):
+            _discard(row["record_tmp"])
+
+
+# ============================================================
+# Import
+# ============================================================
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def _import_batch(db: Session, batch: list, records, pool, errors: list) -> dict:
+    # one row per wallet; a second upsert of the same row in one statement fails
+    rows, seen = [], set()
+    for line, row in batch:
+        if row["wallet_address"] in seen:
+            errors.append({"row": line, "error": "duplicate wallet_address in input"})
+            continue
+        seen.add(row["wallet_address"])
+        rows.append((line, row))
+
+    # hash + store attached records in parallel
+    if records is not None:
+        futures = [
+            (line, row, pool.submit(_store_record, records, row["wallet_address"], row["record_file"]))
+            for line, row in rows if row["record_file"]
+        ]
+        failed = set()
+        for line, row, future in futures:
+            try:
+                row["record_tmp"], row["initial_record_url"], row["initial_record_hash"] = future.result()
+            except KeyError:
+                errors.append({"row": line, "error": f"record_file {row['record_file']!r} not in archive"})
+                failed.add(line)
+            except (zipfile.BadZipFile, zlib.error) as e:
+                errors.append({"row": line, "error": f"corrupt record_file {row['record_file']!r}: {e}"})
+                failed.add(line)
+            except OSError as e:
+                errors.append({"row": line, "error": f"could not store record: {e}"})
+                failed.add(line)
+        rows = [(line, row) for line, row in rows if line not in failed]
+    else:
+        for line, row in rows:
+            if row["record_file"]:
+                errors.append({"row": line, "error": "record_file given but no records archive"})
+        rows = [(line, row) for line, row in rows if not row["record_file"]]
+
+    if not rows:
+        return {"created": 0, "updated": 0}
+
+    wallets = [row["wallet_address"] for _, row in rows]
+    existing = set(db.execute(
+        select(Patient.wallet_address).where(Patient.wallet_address.in_(wallets))
+    ).scalars().all())
+    study_ids = iter(allocate_study_ids(db, len(wallets) - len(existing)))
+
+    now = datetime.now()
+    values = []
+    for _, row in rows:
+        value = {
+            "wallet_address": row["wallet_address"],
+            "age": row["age"],
+            "gender": row["gender"],
+            "study_id": None if row["wallet_address"] in existing else next(study_ids),
+            "created_at": now,
+            "updated_at": now,
+        }
+        if row.get("initial_record_hash"):
+            value["initial_record_url"] = row["initial_record_url"]
+            value["initial_record_hash"] = row["initial_record_hash"]
+            value["initial_record_tx_hash"] = row["tx_hash"]
+        values.append(value)
+
+    # rows must share keys for a multi-row VALUES; fill missing record fields
+    record_keys = ("initial_record_url", "initial_record_hash", "initial_record_tx_hash")
+    if any("initial_record_hash" in v for v in values):
+        for v in values:
+            for k in record_keys:
+                v.setdefault(k, None)
+
+    insert = _insert(db)
+    stmt = insert(Patient).values(values)
+    update = {
+        "age": stmt.excluded.age,
+        "gender": stmt.excluded.gender,
+        "updated_at": stmt.excluded.updated_at,
+    }
+    if "initial_record_hash" in values[0]:
+        # keep an existing record when this row didn't bring one; the url,
+        # hash and tx are replaced together so they always describe one file
+        brought_record = stmt.excluded.initial_record_hash.isnot(None)
+        for k in record_keys:
+            update[k] = case((brought_record, stmt.excluded[k]), else_=Patient.__table__.c[k])
+    stmt = stmt.on_conflict_do_update(index_elements=["wallet_address"], set_=update)
+
+    try:
+        db.execute(stmt)
+        db.commit()
+    except Exception:
+        db.rollback()
+        _discard_records(rows)
+        raise
+    _publish_records(rows)
+    return {"created": len(values) - len(existing), "updated": len(existing)}
+
+
+def import_patients(db: Session, stream, fmt: str = "csv", records_stream=None,
+                    batch_size: int = BATCH_SIZE, on_progress=None) -> dict:
+    """
+    Import patients from `stream`. `records_stream` is an optional zip of
+    record files referenced by the `record_file` column. Returns totals and
+    per-row errors (row = line number in the input). Raises ValueError if
+    `records_stream` is not a zip archive.
+    """
+    records = None
+    if records_stream is not None:
+        try:
+            records = zipfile.ZipFile(records_stream)
+        except zipfile.BadZipFile:
+            raise ValueError("records must be a zip archive")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    summary = {"rows": 0, "created": 0, "updated": 0, "errors": []}
+    batch = []
+
+    def flush():
+        result = _import_batch(db, batch, records, pool, summary["errors"])
+        summary["created"] += result["created"]
+        summary["updated"] += result["updated"]
+        batch.clear()
+        if on_progress:
+            on_progress(summary)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for line, raw in iter_rows(stream, fmt):
+            summary["rows"] += 1
+            try:
+                batch.append((line, _clean(raw)))
+            except ValueError as e:
+                summary["errors"].append({"row": line, "error": str(e)})
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    if records is not None:
+        records.close()
+    return summary
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def main():
+    from app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk patient onboarding import")
+    parser.add_argument("input", help="CSV or NDJSON file with wallet_address, age, gender")
+    parser.add_argument("--records", help="zip archive with the files named in record_file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    def progress(summary):
+        print(
+            f"{summary['rows']} rows read, {summary['created']} created, "
+            f"{summary['updated']} updated, {len(summary['errors'])} errors"
+        )
+
+    db = SessionLocal()
+    records = open(args.records, "rb") if args.records else None
+    try:
+        with open(args.input, "rb") as f:
+            summary = import_patients(
+                db, f, args.format or detect_format(args.input),
+                records_stream=records, batch_size=args.batch_size, on_progress=progress,
+            )
+    finally:
+        db.close()
+        if records:
+            records.close()
+
+    for e in summary["errors"]:
+        print(f"row {e['row']}: {e['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# backend/app/idempotency.py
+"""
+Retry-safe writes keyed on tx_hash.
+
+Every write endpoint carries the hash of the on-chain transaction it mirrors,
+so a resubmission is recognised by its tx_hash: first by a short-lived
+in-memory cache of recent responses, then by the database itself, where each
+insert is a single INSERT ... ON CONFLICT DO NOTHING RETURNING statement.
+Consent changes only update the patient, so each one is also recorded in
+consent_events; a retried grant/revoke is then never applied twice.
+Both are scoped to the submitter (wallet / study ID): a tx_hash already
+recorded for someone else raises TxHashConflict instead of returning their row.
+
+    python -m app.idempotency migrate   # dedupe existing rows, add constraints
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import JSON, Boolean, DateTime, String, literal, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models import Base, Patient, SelfReport, AccessLog, AccessLogTxHash, ConsentEvent
+
+TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300"))
+MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+
+# ============================================================
+# Response cache
+# ============================================================
+
+class TxHashConflict(Exception):
+    """The tx_hash is already recorded for a different submitter."""
+
+
+class IdempotencyCache:
+    """(endpoint, owner, tx_hash) -> response, evicted by age and LRU size."""
+
+    def __init__(self, ttl: float = TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str, owner: str, tx_hash: str):
+        key = (endpoint, owner, tx_hash)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def put(self, endpoint: str, owner: str, tx_hash: str, response):
+        key = (endpoint, owner, tx_hash)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+cache = IdempotencyCache()
+
+
+# ============================================================
+# Single-statement writes
+# ============================================================
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _insert(db: Session):
+    if _is_postgres(db):
+        return postgresql.insert
+    return sqlite.insert
+
+
+def _patient_exists(db: Session, condition) -> bool:
+    return db.execute(select(Patient.id).where(condition)).first() is not None
+
+
+def insert_self_report(db: Session, wallet: str, symptoms, medication_compliance,
+                       content_hash: str, tx_hash: str):
+    """
+    Insert a report for `wallet` unless `tx_hash` is already recorded.
+    Returns the new or existing SelfReport, or None if the patient is unknown.
+    Raises TxHashConflict if `tx_hash` belongs to another patient's report.
+    """
+    now = datetime.now()
+    source = select(
+        Patient.id,
+        literal(symptoms, JSON),
+        literal(medication_compliance, Boolean),
+        literal(content_hash, String),
+        literal(tx_hash, String),
+        literal(now, DateTime),
+        literal(now, DateTime),
+    ).where(Patient.wallet_address == wallet)
+
+    stmt = (
+        _insert(db)(SelfReport)
+        .from_select(
+            ["patient_id", "symptoms", "medication_compliance", "content_hash",
+             "tx_hash", "created_at", "updated_at"],
+            source,
+        )
+        .on_conflict_do_nothing(index_elements=["tx_hash"])
+        .returning(SelfReport.id)
+    )
+    report_id = db.execute(stmt).scalar()
+    db.commit()
+
+    if report_id is None:
+        # duplicate tx_hash (or no such patient)
+        stmt = (
+            select(SelfReport, Patient.wallet_address)
+            .join(Patient, SelfReport.patient_id == Patient.id)
+            .where(SelfReport.tx_hash == tx_hash)
+        )
+        row = db.execute(stmt).first()
+        if row is None or not _patient_exists(db, Patient.wallet_address == wallet):
+            return None
+        if row.wallet_address != wallet:
+            raise TxHashConflict(tx_hash)
+        return row.SelfReport
+    return db.get(SelfReport, report_id)
+
+
+def apply_consent(db: Session, wallet: str, authorized: bool, tx_hash: str):
+    """
+    Record a consent grant/revoke for `wallet` and apply it, unless `tx_hash`
+    is already recorded: then the stored event is returned and the patient
+    is left alone, so a stale retry can't undo a later change.
+    Returns the ConsentEvent, or None if the patient is unknown.
+    Raises TxHashConflict if `tx_hash` was used for another patient or action.
+    """
+    source = select(
+        Patient.id,
+        literal(authorized, Boolean),
+        literal(tx_hash, String),
+        literal(datetime.utcnow(), DateTime),
+    ).where(Patient.wallet_address == wallet)
+
+    stmt = (
+        _insert(db)(ConsentEvent)
+        .from_select(["patient_id", "authorized", "tx_hash", "created_at"], source)
+        .on_conflict_do_nothing(index_elements=["tx_hash"])
+        .returning(ConsentEvent.id, ConsentEvent.patient_id)
+    )
+    claimed = db.execute(stmt).first()
+    if claimed is not None:
+        db.execute(
+            update(Patient)
+            .where(Patient.id == claimed.patient_id)
+            .values(authorized=authorized, updated_at=datetime.now())
+        )
+    db.commit()
+
+    if claimed is None:
+        # duplicate tx_hash (or no such patient)
+        stmt = (
+            select(ConsentEvent, Patient.wallet_address)
+            .join(Patient, ConsentEvent.patient_id == Patient.id)
+            .where(ConsentEvent.tx_hash == tx_hash)
+        )
+        row = db.execute(stmt).first()
+        if row is None or not _patient_exists(db, Patient.wallet_address == wallet):
+            return None
+        if (row.wallet_address, row.ConsentEvent.authorized) != (wallet, authorized):
+            raise TxHashConflict(tx_hash)
+        return row.ConsentEvent
+    return db.get(ConsentEvent, claimed.id)
+
+
+# Postgres: claim the tx_hash and insert the log in one statement. The claim
+# only happens when the patient exists, so a 404 doesn't burn the tx_hash.
+_ACCESS_LOG_PG = text("""
+WITH claim AS (
+    INSERT INTO access_log_tx_hashes (tx_hash)
+    SELECT :tx_hash WHERE EXISTS (SELECT 1 FROM patients WHERE study_id = :study_id)
+    ON CONFLICT DO NOTHING
+    RETURNING tx_hash
+)
+INSERT INTO access_logs
+    (hospital_wallet, patient_id, purpose, chain_timestamp, db_timestamp, tx_hash)
+SELECT :hospital_wallet, p.id, :purpose, :now, :now, claim.tx_hash
+FROM patients p, claim
+WHERE p.study_id = :study_id
+RETURNING id
+""")
+
+
+def insert_access_log(db: Session, study_id: str, hospital_wallet: str,
+                      purpose, tx_hash: str):
+    """
+    Record an access unless `tx_hash` is already recorded.
+    Returns the new or existing log id, or None if the patient is unknown.
+    Raises TxHashConflict if `tx_hash` is recorded for another patient or
+    hospital.
+    """
+    now = datetime.utcnow()
+    if _is_postgres(db):
+        log_id = db.execute(_ACCESS_LOG_PG, {
+            "tx_hash": tx_hash, "study_id": study_id,
+            "hospital_wallet": hospital_wallet, "purpose": purpose, "now": now,
+        }).scalar()
+    else:
+        source = select(
+            literal(hospital_wallet, String),
+            Patient.id,
+            literal(purpose, String),
+            literal(now, DateTime),
+            literal(now, DateTime),
+            literal(tx_hash, String),
+        ).where(Patient.study_id == study_id)
+        stmt = (
+            sqlite.insert(AccessLog)
+            .from_select(
+                ["hospital_wallet", "patient_id", "purpose", "chain_timestamp",
+                 "db_timestamp", "tx_hash"],
+                source,
+            )
+            .on_conflict_do_nothing(index_elements=["tx_hash"])
+            .returning(AccessLog.id)
+        )
+        log_id = db.execute(stmt).scalar()
+    db.commit()
+
+    if log_id is None:
+        if not _patient_exists(db, Patient.study_id == study_id):
+            return None
+        stmt = (
+            select(AccessLog.id, AccessLog.hospital_wallet, Patient.study_id)
+            .join(Patient, AccessLog.patient_id == Patient.id)
+            .where(AccessLog.tx_hash == tx_hash)
+        )
+        row = db.execute(stmt).first()
+        # no row: the tx_hash is claimed but its log was archived
+        if row is None or (row.study_id, row.hospital_wallet) != (study_id, hospital_wallet):
+            raise TxHashConflict(tx_hash)
+        return row.id
+    return log_id
+
+
+# ============================================================
+# Migration for databases created before tx_hash was unique
+# ============================================================
+
+def _dedupe(conn, table: str):
+    """Keep the first row per tx_hash."""
+    conn.execute(text(
+        f"DELETE FROM {table} WHERE tx_hash IS NOT NULL AND id NOT IN "
+        f"(SELECT MIN(id) FROM {table} WHERE tx_hash IS NOT NULL GROUP BY tx_hash)"
+    ))
+
+
+def migrate(engine: Engine):
+    from app.partitions import is_partitioned
+
+    Base.metadata.create_all(
+        bind=engine, tables=[AccessLogTxHash.__table__, ConsentEvent.__table__],
+    )
+    postgres = engine.dialect.name == "postgresql"
+
+    with engine.begin() as conn:
+        _dedupe(conn, SelfReport.__tablename__)
+        _dedupe(conn, AccessLog.__tablename__)
+
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_self_reports_tx_hash "
+            "ON self_reports (tx_hash)"
+        ))
+        if postgres and is_partitioned(conn):
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_access_logs_tx_hash ON access_logs (tx_hash)"
+            ))
+        else:
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_access_logs_tx_hash "
+                "ON access_logs (tx_hash)"
+            ))
+
+        if postgres:
+            conn.execute(text(
+                "INSERT INTO access_log_tx_hashes (tx_hash) "
+                "SELECT DISTINCT tx_hash FROM access_logs WHERE tx_hash IS NOT NULL "
+                "ON CONFLICT DO NOTHING"
+            ))
+    print("tx_hash uniqueness migrated")
+
+
+if __name__ == "__main__":
+    import sys
+    from app.db import engine
+
+    if sys.argv[1:] != ["migrate"]:
+        print("usage: python -m app.idempotency migrate")
+        sys.exit(1)
+    migrate(engine)
@@ -3,9 +3,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.db import engine
-from app.models import Base
+from app.db import LAST_WRITE_HEADER, engine, SessionLocal
+from app.partitions import create_tables, start_partition_maintenance
 from app.server import router as api_router
+from app.study_ids import sync_study_id_sequence
 
 app = FastAPI(title="Patient-Hospital Blockchain API")
 
@@ -16,6 +17,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LAST_WRITE_HEADER],
 )
 
 # Static files
@@ -24,7 +26,10 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 # --- Init DB ---
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
+    create_tables(engine)
+    start_partition_maintenance(engine)
+    with SessionLocal() as db:
+        sync_study_id_sequence(db)
 
 # APIs
 app.include_router(api_router)
@@ -9,11 +9,15 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     JSON,
+    Sequence,
 )
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
 
+# Numbers for study IDs (CT-{year}-{n:04d}); allocated in blocks on Postgres
+study_id_seq = Sequence("study_id_seq", metadata=Base.metadata)
+
 # ============================================================
 # Patient — Basic Profile
 # ============================================================
@@ -77,7 +81,8 @@ class SelfReport(Base):
 
     # On-chain integrity fields
     content_hash = Column(String, nullable=True)
-    tx_hash = Column(String, nullable=True)
+    # unique: a resubmitted report (same tx) must not create a second row
+    tx_hash = Column(String, unique=True, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(
@@ -109,10 +114,55 @@ class AccessLog(Base):
     chain_timestamp = Column(DateTime, nullable=True)
     db_timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
 
-    tx_hash = Column(String, nullable=True)
+    # unique (on partitioned Postgres enforced through AccessLogTxHash)
+    tx_hash = Column(String, unique=True, nullable=True)
 
     def __repr__(self):
         return (
             f"<AccessLog(id={self.id}, hospital_wallet={self.hospital_wallet}, "
             f"patient_id={self.patient_id}, purpose={self.purpose})>"
         )
+
+
+# ============================================================
+# AccessLogTxHash — tx_hash claims for partitioned access_logs
+# ============================================================
+
+class AccessLogTxHash(Base):
+    """
+    Postgres can't enforce a unique tx_hash on the partitioned access_logs
+    table (unique keys must include the partition key), so each access log
+    insert first claims its tx_hash here.
+    """
+    __tablename__ = "access_log_tx_hashes"
+
+    tx_hash = Column(String, primary_key=True)
+
+    def __repr__(self):
+        return f"<AccessLogTxHash(tx_hash={self.tx_hash})>"
+
+
+# ============================================================
+# ConsentEvent — one row per consent grant / revoke transaction
+# ============================================================
+
+class ConsentEvent(Base):
+    __tablename__ = "consent_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+
+    # True = grant, False = revoke
+    authorized = Column(Boolean, nullable=False)
+
+    # unique: a retried grant/revoke must not be applied a second time
+    tx_hash = Column(String, unique=True, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<ConsentEvent(id={self.id}, patient_id={self.patient_id}, "
+            f"authorized={self.authorized})>"
+        )
@@ -0,0 +1,447 @@
+# backend/app/partitions.py
+"""
+Monthly partitions for access_logs, plus archival of cold months.
+
+On Postgres access_logs is a RANGE-partitioned table on db_timestamp with one
+partition per month (access_logs_pYYYY_MM) and a default partition as a safety
+net; its rows move to a month's partition when that is created, or are
+archived with the month. Postgres requires the partition key in the primary key, so the table is
+created here with (id, db_timestamp) as its key; the ORM keeps mapping `id`.
+
+On SQLite there is no partitioning: the regular table is used and archival
+deletes the archived rows instead of dropping a partition.
+
+Archived months are written as gzip NDJSON files with a SHA-256 checksum in
+ACCESS_LOG_ARCHIVE_DIR/manifest.json and can be read back with query_archive().
+
+    python -m app.partitions ensure    # create upcoming partitions
+    python -m app.partitions migrate   # convert an existing plain table
+    python -m app.partitions archive   # archive months older than the cutoff
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+
+from app.models import Base, AccessLog
+
+# Partitions are kept this many months ahead of the current month
+PARTITION_MONTHS_AHEAD = int(os.getenv("ACCESS_LOG_PARTITION_MONTHS_AHEAD", "3"))
+
+# Months older than this are moved to the archive
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ACCESS_LOG_ARCHIVE_AFTER_MONTHS", "12"))
+
+ARCHIVE_DIR = pathlib.Path(
+    os.getenv("ACCESS_LOG_ARCHIVE_DIR", pathlib.Path(__file__).parent / ".." / "archive")
+).resolve()
+
+MAINTENANCE_INTERVAL_SECONDS = 24 * 3600
+
+# Rows fetched per round trip while writing an archive file
+ARCHIVE_BATCH_SIZE = int(os.getenv("ACCESS_LOG_ARCHIVE_BATCH_SIZE", "5000"))
+
+TABLE = AccessLog.__tablename__
+COLUMNS = [
+    "id", "hospital_wallet", "patient_id", "purpose",
+    "chain_timestamp", "db_timestamp", "tx_hash",
+]
+
+PARTITIONED_DDL = f"""
+CREATE TABLE {TABLE} (
+    id SERIAL,
+    hospital_wallet VARCHAR NOT NULL,
+    patient_id INTEGER NOT NULL REFERENCES patients (id),
+    purpose VARCHAR,
+    chain_timestamp TIMESTAMP WITHOUT TIME ZONE,
+    db_timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    tx_hash VARCHAR,
+    PRIMARY KEY (id, db_timestamp)
+) PARTITION BY RANGE (db_timestamp)
+"""
+
+
+# ============================================================
+# Month helpers
+# ============================================================
+
+def month_start(d: datetime) -> datetime:
+    return datetime(d.year, d.month, 1)
+
+
+def add_months(d: datetime, n: int) -> datetime:
+    index = d.year * 12 + d.month - 1 + n
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def _is_postgres(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+# ============================================================
+# Schema
+# ============================================================
+
+def is_partitioned(conn) -> bool:
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": TABLE}
+    ).scalar()
+    return kind == "p"
+
+
+def _create_partitioned(conn):
+    conn.execute(text(PARTITIONED_DDL))
+    conn.execute(text(f"CREATE INDEX ix_{TABLE}_id ON {TABLE} (id)"))
+    conn.execute(text(f"CREATE INDEX ix_{TABLE}_db_timestamp ON {TABLE} (db_timestamp)"))
+    conn.execute(text(f"CREATE INDEX ix_{TABLE}_tx_hash ON {TABLE} (tx_hash)"))
+    conn.execute(text(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+
+
+def create_tables(engine: Engine):
+    """create_all(), with access_logs created partitioned on Postgres."""
+    if not _is_postgres(engine):
+        Base.metadata.create_all(bind=engine)
+        return
+
+    others = [t for t in Base.metadata.sorted_tables if t.name != TABLE]
+    Base.metadata.create_all(bind=engine, tables=others)
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:t)"), {"t": TABLE}).scalar()
+        if exists is None:
+            _create_partitioned(conn)
+        elif not is_partitioned(conn):
+            print(f"{TABLE} is not partitioned; run `python -m app.partitions migrate`")
+            return
+    ensure_partitions(engine)
+
+
+def _create_partition(conn, month: datetime):
+    """
+    Create the partition for `month`, moving any rows for that month out of
+    the default partition first (Postgres refuses to attach it otherwise).
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:t)"), {"t": name}).scalar() is not None:
+        return
+    bounds = {"start": month, "end": add_months(month, 1)}
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {TABLE}_default "
+        f"WHERE db_timestamp >= :start AND db_timestamp < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    ))
+
+
+def ensure_partitions(engine: Engine, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Create partitions for the current month and the next `months_ahead`."""
+    if not _is_postgres(engine):
+        return
+    current = month_start(datetime.utcnow())
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        for n in range(months_ahead + 1):
+            _create_partition(conn, add_months(current, n))
+
+
+def migrate(engine: Engine, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Convert an existing plain access_logs table to a partitioned one."""
+    if not _is_postgres(engine):
+        print("Partitioning is only supported on Postgres")
+        return
+    old = f"{TABLE}_unpartitioned"
+    cols = ", ".join(COLUMNS)
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            print(f"{TABLE} is already partitioned")
+            return
+
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {TABLE}_pkey RENAME TO {old}_pkey"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS ix_{TABLE}_id RENAME TO ix_{old}_id"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {TABLE}_tx_hash_key RENAME TO {old}_tx_hash_key"))
+        _create_partitioned(conn)
+
+        first = conn.execute(text(f"SELECT MIN(db_timestamp) FROM {old}")).scalar()
+        month = month_start(first or datetime.utcnow())
+        last = add_months(month_start(datetime.utcnow()), months_ahead)
+        while month <= last:
+            _create_partition(conn, month)
+            month = add_months(month, 1)
+
+        conn.execute(text(f"INSERT INTO {TABLE} ({cols}) SELECT {cols} FROM {old}"))
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f"COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}"
+        ))
+        conn.execute(text(f"DROP TABLE {old}"))
+    print(f"{TABLE} migrated to monthly partitions")
+
+
+def start_partition_maintenance(engine: Engine):
+    """Keep upcoming partitions created while the server runs."""
+    if not _is_postgres(engine):
+        return
+
+    def loop():
+        while True:
+            time.sleep(MAINTENANCE_INTERVAL_SECONDS)
+            try:
+                ensure_partitions(engine)
+            except Exception as e:
+                print(f"Partition maintenance failed: {e}")
+
+    threading.Thread(target=loop, name="access-log-partitions", daemon=True).start()
+
+
+# ============================================================
+# Archive
+# ============================================================
+
+def _manifest_path() -> pathlib.Path:
+    return ARCHIVE_DIR / "manifest.json"
+
+
+def load_manifest() -> list:
+    path = _manifest_path()
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def archived_until():
+    """End of the latest archived month, or None if nothing is archived."""
+    ends = [datetime.fromisoformat(e["to"]) for e in load_manifest()]
+    return max(ends) if ends else None
+
+
+def _write_atomic(path: pathlib.Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _encode_row(row) -> dict:
+    return {
+        k: v.isoformat() if isinstance(v, datetime) else v
+        for k, v in row._mapping.items()
+    }
+
+
+def _archive_file(month: datetime) -> pathlib.Path:
+    path = ARCHIVE_DIR / f"{partition_name(month)}.ndjson.gz"
+    n = 1
+    while path.exists():
+        path = ARCHIVE_DIR / f"{partition_name(month)}.{n}.ndjson.gz"
+        n += 1
+    return path
+
+
+def _read_archive(entry: dict):
+    """Yield the rows of an archive file after checking its checksum."""
+    path = ARCHIVE_DIR / entry["file"]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    if digest.hexdigest() != entry["sha256"]:
+        raise ValueError(f"Checksum mismatch for archive {entry['file']}")
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class _HashingWriter:
+    """File wrapper that hashes the bytes written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _archive_month(engine: Engine, month: datetime, manifest: list):
+    end = add_months(month, 1)
+    table = AccessLog.__table__
+    stmt = (
+        select(*[table.c[c] for c in COLUMNS])
+        .where(table.c.db_timestamp >= month, table.c.db_timestamp < end)
+        .order_by(table.c.id)
+    )
+
+    # a rerun after a failed drop finds rows that are already archived; only
+    # rows that arrived since then get a new file. ids are paired with the
+    # timestamp because SQLite can reuse ids once archived rows are deleted.
+    archived = {
+        (row["id"], row["db_timestamp"])
+        for entry in manifest if entry["from"] == month.isoformat()
+        for row in _read_archive(entry)
+    }
+
+    # rows are streamed into the file, never held in memory all at once
+    path = _archive_file(month)
+    tmp = path.with_name(path.name + ".tmp")
+    rows = 0
+    try:
+        with open(tmp, "wb") as raw:
+            out = _HashingWriter(raw)
+            with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+                with engine.connect() as conn:
+                    result = conn.execution_options(yield_per=ARCHIVE_BATCH_SIZE).execute(stmt)
+                    for r in result:
+                        row = _encode_row(r)
+                        if (row["id"], row["db_timestamp"]) in archived:
+                            continue
+                        gz.write((json.dumps(row) + "\n").encode())
+                        rows += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    if rows:
+        os.replace(tmp, path)
+        manifest.append({
+            "file": path.name,
+            "from": month.isoformat(),
+            "to": end.isoformat(),
+            "rows": rows,
+            "sha256": out.sha256.hexdigest(),
+            "archived_at": datetime.utcnow().isoformat(),
+        })
+        _write_atomic(_manifest_path(), json.dumps(manifest, indent=2).encode())
+    else:
+        tmp.unlink()
+
+    with engine.begin() as conn:
+        if _is_postgres(engine):
+            name = partition_name(month)
+            if conn.execute(text("SELECT to_regclass(:t)"), {"t": name}).scalar() is not None:
+                conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            # rows for this month that landed in the default partition
+            conn.execute(text(
+                f"DELETE FROM {TABLE}_default WHERE db_timestamp >= :start AND db_timestamp < :end"
+            ), {"start": month, "end": end})
+        else:
+            conn.execute(
+                table.delete().where(table.c.db_timestamp >= month, table.c.db_timestamp < end)
+            )
+    return rows
+
+
+def archive_cold(engine: Engine, after_months: int = ARCHIVE_AFTER_MONTHS) -> list:
+    """Archive every month that ended more than `after_months` ago."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    cutoff = add_months(month_start(datetime.utcnow()), -after_months)
+
+    if _is_postgres(engine):
+        with engine.connect() as conn:
+            if not is_partitioned(conn):
+                print(f"{TABLE} is not partitioned; nothing to archive")
+                return []
+            names = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:t)"
+            ), {"t": TABLE}).scalars().all()
+            default_months = conn.execute(text(
+                f"SELECT DISTINCT date_trunc('month', db_timestamp) FROM {TABLE}_default "
+                f"WHERE db_timestamp < :cutoff"
+            ), {"cutoff": cutoff}).scalars().all()
+        prefix = f"{TABLE}_p"
+        months = sorted({
+            datetime.strptime(n[len(prefix):], "%Y_%m")
+            for n in names if n.startswith(prefix)
+        } | set(default_months))
+    else:
+        table = AccessLog.__table__
+        with engine.connect() as conn:
+            first = conn.execute(select(table.c.db_timestamp).order_by(table.c.db_timestamp).limit(1)).scalar()
+        months = []
+        month = month_start(first) if first else cutoff
+        while month < cutoff:
+            months.append(month)
+            month = add_months(month, 1)
+
+    manifest = load_manifest()
+    archived = []
+    for month in months:
+        if month >= cutoff:
+            break
+        rows = _archive_month(engine, month, manifest)
+        # on SQLite empty months have nothing to drop, so don't report them
+        if rows or _is_postgres(engine):
+            archived.append({"month": f"{month:%Y-%m}", "rows": rows})
+    return archived
+
+
+def query_archive(start: datetime, end: datetime) -> list:
+    """Rows with start <= db_timestamp < end from archived months."""
+    result = []
+    for entry in load_manifest():
+        if datetime.fromisoformat(entry["to"]) <= start or datetime.fromisoformat(entry["from"]) >= end:
+            continue
+
+        for row in _read_archive(entry):
+            ts = datetime.fromisoformat(row["db_timestamp"])
+            if start <= ts < end:
+                result.append(row)
+
+    result.sort(key=lambda r: r["db_timestamp"], reverse=True)
+    return result
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def main():
+    from app.db import engine
+
+    parser = argparse.ArgumentParser(description="access_logs partition maintenance")
+    parser.add_argument("command", choices=["ensure", "migrate", "archive"])
+    parser.add_argument("--months", type=int, default=None,
+                        help="months ahead (ensure/migrate) or archive cutoff in months")
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        ensure_partitions(engine, args.months if args.months is not None else PARTITION_MONTHS_AHEAD)
+        print("Partitions ensured")
+    elif args.command == "migrate":
+        migrate(engine, args.months if args.months is not None else PARTITION_MONTHS_AHEAD)
+    else:
+        archived = archive_cold(engine, args.months if args.months is not None else ARCHIVE_AFTER_MONTHS)
+        for a in archived:
+            print(f"Archived {a['month']}: {a['rows']} rows")
+
+
+if __name__ == "__main__":
+    main()
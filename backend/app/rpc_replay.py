@@ -0,0 +1,528 @@
+# backend/app/rpc_replay.py
+"""
+Local JSON-RPC stand-in for the Ethereum node, for running and benchmarking
+the chain-facing code (web3util.py) without RPC_URL / CONTRACT_ADDRESS.
+
+It serves a synthetic, deterministic ClinicalTrialRegistry event history of
+any size. Logs are computed from their index rather than stored, so histories
+with millions of logs cost no memory. Each patient's events follow a fixed
+pattern: they start with ConsentGranted, then uploads, accesses and an
+occasional revoke/re-grant. That keeps the history consistent with the
+contract rules, and `patientConsent` can be answered for any block.
+
+Supported methods: eth_blockNumber, eth_getLogs, eth_call (hospital,
+patientConsent), eth_getTransactionReceipt, eth_newFilter / eth_getFilterLogs
+(used by web3's create_filter), eth_chainId, net_version, plus replay_stats /
+replay_resetStats for RPC call counts.
+
+Faults can be injected: fixed + jittered latency, a max block range and max
+result count for log queries (returned as -32005 errors like hosted
+providers do), and a random failure rate.
+
+    python -m app.rpc_replay --logs 1000000 --patients 1000 --port 8545
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import encode
+from eth_utils import keccak
+
+CHAIN_ID = 31337
+GENESIS_TIMESTAMP = 1700000000
+BLOCK_TIME = 12
+
+DEFAULT_CONTRACT = "0x" + "11" * 20
+DEFAULT_HOSPITAL = "0x" + "22" * 20
+
+EVENT_SIGNATURES = {
+    "ConsentGranted": "ConsentGranted(address,uint256)",
+    "ConsentRevoked": "ConsentRevoked(address,uint256)",
+    "DataUploaded": "DataUploaded(address,bytes32,uint256)",
+    "DataAccess": "DataAccess(address,address,string,uint256)",
+}
+TOPICS = {name: "0x" + keccak(text=sig).hex() for name, sig in EVENT_SIGNATURES.items()}
+EVENTS_BY_TOPIC = {topic: name for name, topic in TOPICS.items()}
+
+SELECTOR_HOSPITAL = "0x" + keccak(text="hospital()")[:4].hex()
+SELECTOR_PATIENT_CONSENT = "0x" + keccak(text="patientConsent(address)")[:4].hex()
+
+# Consent enum in the contract
+CONSENT_NONE, CONSENT_ACTIVE, CONSENT_REVOKED = 0, 1, 2
+
+# A patient's k-th event (k >= 1); k = 0 is always ConsentGranted.
+# Accesses only ever follow an active consent.
+PATTERN = [
+    "DataUploaded", "DataAccess", "DataAccess", "DataUploaded",
+    "DataAccess", "ConsentRevoked", "ConsentGranted", "DataAccess",
+]
+
+PURPOSES = ["routine review", "adverse event follow-up", "eligibility check", "audit"]
+
+
+def _word(n: int) -> str:
+    return f"{n:064x}"
+
+
+# string tail: length word + right-padded utf-8 bytes
+_ENCODED_PURPOSES = [encode(["string"], [p])[32:].hex() for p in PURPOSES]
+
+
+def event_kind(k: int) -> str:
+    return "ConsentGranted" if k == 0 else PATTERN[(k - 1) % len(PATTERN)]
+
+
+def _topic_address(address: str) -> str:
+    return "0x" + "00" * 12 + address[2:].lower()
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+# ============================================================
+# Synthetic event history
+# ============================================================
+
+class SyntheticHistory:
+    """
+    Log i belongs to patient i % n_patients, is that patient's
+    (i // n_patients)-th event, and sits in block i // logs_per_block.
+    """
+
+    def __init__(self, n_logs: int, n_patients: int = 1000, logs_per_block: int = 10,
+                 seed: int = 0, contract_address: str = DEFAULT_CONTRACT,
+                 hospital_address: str = DEFAULT_HOSPITAL):
+        self.n_logs = n_logs
+        self.n_patients = n_patients
+        self.logs_per_block = logs_per_block
+        self.seed = seed
+        self.contract_address = contract_address.lower()
+        self.hospital_address = hospital_address.lower()
+        self.head_block = max(n_logs - 1, 0) // logs_per_block
+
+        self._seed_bytes = seed.to_bytes(8, "big")
+        self.patients = [self._make_address(b"patient", p) for p in range(n_patients)]
+        self._patient_index = {a: p for p, a in enumerate(self.patients)}
+
+    def _digest(self, label: bytes, n: int) -> bytes:
+        # synthetic hashes only need to be deterministic; blake2b is much
+        # cheaper than keccak per call, which matters at millions of logs
+        return hashlib.blake2b(
+            self._seed_bytes + label + n.to_bytes(8, "big"), digest_size=32
+        ).digest()
+
+    def _make_address(self, label: bytes, n: int) -> str:
+        return "0x" + self._digest(label, n)[-20:].hex()
+
+    # --------------------------------------------------------
+    # Blocks / transactions
+    # --------------------------------------------------------
+
+    def block_hash(self, block: int) -> str:
+        return "0x" + self._digest(b"block", block).hex()
+
+    def block_timestamp(self, block: int) -> int:
+        return GENESIS_TIMESTAMP + block * BLOCK_TIME
+
+    def tx_hash(self, i: int) -> str:
+        # the last 8 bytes carry the log index so receipts can be looked up
+        return "0x" + self._digest(b"tx", i)[:24].hex() + f"{i:016x}"
+
+    def index_of_tx(self, tx_hash: str):
+        try:
+            i = int(tx_hash[-16:], 16)
+        except ValueError:
+            return None
+        if i >= self.n_logs or self.tx_hash(i) != tx_hash.lower():
+            return None
+        return i
+
+    def last_index_at(self, block: int) -> int:
+        return min(self.n_logs, (block + 1) * self.logs_per_block) - 1
+
+    # --------------------------------------------------------
+    # Logs
+    # --------------------------------------------------------
+
+    def kind(self, i: int) -> str:
+        return event_kind(i // self.n_patients)
+
+    def sender(self, i: int) -> str:
+        if self.kind(i) == "DataAccess":
+            return self.hospital_address
+        return self.patients[i % self.n_patients]
+
+    def log(self, i: int) -> dict:
+        kind = self.kind(i)
+        block = i // self.logs_per_block
+        patient = self.patients[i % self.n_patients]
+        timestamp = self.block_timestamp(block)
+
+        # ABI-encoded by hand; the layouts are fixed and eth_abi is slow here
+        topics = [TOPICS[kind], _topic_address(patient)]
+        if kind == "DataUploaded":
+            data = self._digest(b"data", i).hex() + _word(timestamp)
+        elif kind == "DataAccess":
+            topics.append(_topic_address(self.hospital_address))
+            data = _word(0x40) + _word(timestamp) + _ENCODED_PURPOSES[i % len(PURPOSES)]
+        else:
+            data = _word(timestamp)
+
+        return {
+            "address": self.contract_address,
+            "topics": topics,
+            "data": "0x" + data,
+            "blockNumber": hex(block),
+            "blockHash": self.block_hash(block),
+            "transactionHash": self.tx_hash(i),
+            "transactionIndex": hex(i % self.logs_per_block),
+            "logIndex": hex(i % self.logs_per_block),
+            "removed": False,
+        }
+
+    def log_indices(self, from_block: int, to_block: int, kinds=None,
+                    patients=None, accessors=None):
+        """Indices of logs in [from_block, to_block] matching the filters."""
+        lo = max(from_block, 0) * self.logs_per_block
+        hi = min(self.n_logs, (to_block + 1) * self.logs_per_block)
+        if lo >= hi:
+            return []
+        if accessors is not None and self.hospital_address not in accessors:
+            return []
+
+        if patients is not None:
+            # only walk the matching patients' residue classes
+            candidates = []
+            for p in sorted(self._patient_index[a] for a in patients if a in self._patient_index):
+                start = lo + (p - lo) % self.n_patients
+                candidates.extend(range(start, hi, self.n_patients))
+            candidates.sort()
+        else:
+            candidates = range(lo, hi)
+
+        if accessors is not None:
+            kinds = {"DataAccess"} if kinds is None else kinds & {"DataAccess"}
+        if kinds is None:
+            return list(candidates)
+        return [i for i in candidates if self.kind(i) in kinds]
+
+    # --------------------------------------------------------
+    # Contract state
+    # --------------------------------------------------------
+
+    def consent_at(self, patient: str, block: int) -> int:
+        p = self._patient_index.get(patient.lower())
+        last = self.last_index_at(block)
+        if p is None or last < p:
+            return CONSENT_NONE
+        k = (last - p) // self.n_patients
+        while k >= 0:
+            kind = event_kind(k)
+            if kind == "ConsentGranted":
+                return CONSENT_ACTIVE
+            if kind == "ConsentRevoked":
+                return CONSENT_REVOKED
+            k -= 1
+        return CONSENT_NONE
+
+
+# ============================================================
+# JSON-RPC server
+# ============================================================
+
+class Faults:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0,
+                 max_block_range: int = None, max_results: int = None,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.max_block_range = max_block_range
+        self.max_results = max_results
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if not self.latency_ms and not self.jitter_ms:
+            return
+        with self._lock:
+            jitter = self.rng.uniform(0, self.jitter_ms)
+        time.sleep((self.latency_ms + jitter) / 1000)
+
+    def should_fail(self) -> bool:
+        if not self.failure_rate:
+            return False
+        with self._lock:
+            return self.rng.random() < self.failure_rate
+
+
+def _as_set(value):
+    """Filter value (None, a string, or a list of strings) -> lowercase set or None."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {value.lower()}
+    return {v.lower() for v in value}
+
+
+def _topic_to_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, history: SyntheticHistory, faults: Faults = None):
+        super().__init__(address, _Handler)
+        self.history = history
+        self.faults = faults or Faults()
+        self.stats = Counter()
+        self._filters = {}
+        self._next_filter = 1
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve from a background thread (for benchmarks and tests)."""
+        thread = threading.Thread(target=self.serve_forever, name="rpc-replay", daemon=True)
+        thread.start()
+        return thread
+
+    # --------------------------------------------------------
+    # Dispatch
+    # --------------------------------------------------------
+
+    def handle_call(self, request: dict) -> dict:
+        method = request.get("method")
+        params = request.get("params") or []
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        with self._lock:
+            self.stats[method] += 1
+
+        try:
+            if method not in ("replay_stats", "replay_resetStats") and self.faults.should_fail():
+                raise RpcError(-32603, "injected failure")
+            handler = getattr(self, "rpc_" + str(method), None)
+            if handler is None:
+                raise RpcError(-32601, f"method {method} not supported")
+            response["result"] = handler(*params)
+        except RpcError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            response["error"] = {"code": -32602, "message": f"invalid params: {e}"}
+        return response
+
+    def _block(self, tag) -> int:
+        if tag is None or tag in ("latest", "safe", "finalized", "pending"):
+            return self.history.head_block
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    # --------------------------------------------------------
+    # Methods
+    # --------------------------------------------------------
+
+    def rpc_eth_chainId(self):
+        return hex(CHAIN_ID)
+
+    def rpc_net_version(self):
+        return str(CHAIN_ID)
+
+    def rpc_eth_blockNumber(self):
+        return hex(self.history.head_block)
+
+    def rpc_eth_getLogs(self, criteria: dict):
+        history = self.history
+        if "blockHash" in criteria:
+            raise RpcError(-32602, "blockHash queries not supported")
+
+        from_block = self._block(criteria.get("fromBlock", "latest"))
+        to_block = self._block(criteria.get("toBlock", "latest"))
+        limit = self.faults.max_block_range
+        if limit is not None and to_block - from_block + 1 > limit:
+            raise RpcError(-32005, f"block range too large, max is {limit} blocks")
+
+        addresses = _as_set(criteria.get("address"))
+        if addresses is not None and history.contract_address not in addresses:
+            return []
+
+        topics = list(criteria.get("topics") or []) + [None] * 4
+        kinds = _as_set(topics[0])
+        if kinds is not None:
+            kinds = {EVENTS_BY_TOPIC[t] for t in kinds if t in EVENTS_BY_TOPIC}
+        patients = _as_set(topics[1])
+        if patients is not None:
+            patients = {_topic_to_address(t) for t in patients}
+        accessors = _as_set(topics[2])
+        if accessors is not None:
+            accessors = {_topic_to_address(t) for t in accessors}
+        if topics[3] is not None:
+            return []
+
+        indices = history.log_indices(from_block, to_block, kinds, patients, accessors)
+        limit = self.faults.max_results
+        if limit is not None and len(indices) > limit:
+            raise RpcError(-32005, f"query returned more than {limit} results")
+        return [history.log(i) for i in indices]
+
+    def rpc_eth_newFilter(self, criteria: dict):
+        with self._lock:
+            filter_id = hex(self._next_filter)
+            self._next_filter += 1
+            self._filters[filter_id] = criteria
+        return filter_id
+
+    def rpc_eth_getFilterLogs(self, filter_id: str):
+        criteria = self._filters.get(filter_id)
+        if criteria is None:
+            raise RpcError(-32000, "filter not found")
+        return self.rpc_eth_getLogs(criteria)
+
+    def rpc_eth_getFilterChanges(self, filter_id: str):
+        if filter_id not in self._filters:
+            raise RpcError(-32000, "filter not found")
+        # the history never grows, so there is never anything new
+        return []
+
+    def rpc_eth_uninstallFilter(self, filter_id: str):
+        with self._lock:
+            return self._filters.pop(filter_id, None) is not None
+
+    def rpc_eth_call(self, tx: dict, block=None):
+        history = self.history
+        if (tx.get("to") or "").lower() != history.contract_address:
+            return "0x"
+
+        data = tx.get("data") or tx.get("input") or "0x"
+        selector = data[:10].lower()
+        if selector == SELECTOR_HOSPITAL:
+            return "0x" + encode(["address"], [history.hospital_address]).hex()
+        if selector == SELECTOR_PATIENT_CONSENT:
+            patient = "0x" + data[-40:]
+            consent = history.consent_at(patient, self._block(block))
+            return "0x" + encode(["uint8"], [consent]).hex()
+        raise RpcError(3, "execution reverted")
+
+    def rpc_eth_getTransactionReceipt(self, tx_hash: str):
+        history = self.history
+        i = history.index_of_tx(tx_hash)
+        if i is None:
+            return None
+
+        log = history.log(i)
+        return {
+            "transactionHash": log["transactionHash"],
+            "transactionIndex": log["transactionIndex"],
+            "blockHash": log["blockHash"],
+            "blockNumber": log["blockNumber"],
+            "from": history.sender(i),
+            "to": history.contract_address,
+            "cumulativeGasUsed": hex(50000 * (i % history.logs_per_block + 1)),
+            "gasUsed": hex(50000),
+            "effectiveGasPrice": hex(10 ** 9),
+            "contractAddress": None,
+            "logs": [log],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "type": "0x2",
+        }
+
+    def rpc_replay_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def rpc_replay_resetStats(self):
+        with self._lock:
+            self.stats.clear()
+        return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            payload = None
+
+        self.server.faults.delay()
+        if isinstance(payload, list):
+            body = [self.server.handle_call(r) for r in payload]
+        elif isinstance(payload, dict):
+            body = self.server.handle_call(payload)
+        else:
+            body = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "parse error"}}
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--logs", type=int, default=100000, help="total number of event logs")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--logs-per-block", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--max-block-range", type=int, default=None)
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+
+
+def build_server(args, host: str = "127.0.0.1", port: int = 0) -> ReplayServer:
+    history = SyntheticHistory(
+        args.logs, n_patients=args.patients,
+        logs_per_block=args.logs_per_block, seed=args.seed,
+    )
+    faults = Faults(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        max_block_range=args.max_block_range, max_results=args.max_results,
+        failure_rate=args.failure_rate, seed=args.seed,
+    )
+    return ReplayServer((host, port), history, faults)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic ClinicalTrialRegistry JSON-RPC node")
+    add_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    args = parser.parse_args()
+
+    server = build_server(args, args.host, args.port)
+    history = server.history
+    print(f"Serving {history.n_logs} logs over {history.head_block + 1} blocks at {server.url}")
+    print(f"CONTRACT_ADDRESS={history.contract_address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
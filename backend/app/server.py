@@ -1,6 +1,6 @@
 import os
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from fastapi import (
     APIRouter,
@@ -13,8 +13,15 @@ from fastapi import (
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func
 
-from app.db import get_db
+from app.analytics import get_cohort_snapshot
+from app.bulk_import import detect_format, import_patients
+from app.db import get_db, get_read_db
+from app.idempotency import (
+    TxHashConflict, apply_consent, cache, insert_access_log, insert_self_report,
+)
 from app.models import Patient, SelfReport, AccessLog
+from app.partitions import archived_until, query_archive
+from app.study_ids import allocate_study_ids
 
 router = APIRouter()
 
@@ -47,7 +54,7 @@ def get_patient_basic_info(wallet: str, db: Session = Depends(get_db)):
 # ============================================================
 
 @router.get("/patients")
-def list_patients(db: Session = Depends(get_db)):
+def list_patients(db: Session = Depends(get_read_db)):
     stmt = select(Patient)
     patients = db.execute(stmt).scalars().all()
 
@@ -82,15 +89,11 @@ async def save_patient_basic_info(
     patient = db.execute(stmt).scalar_one_or_none()
 
     if patient is None:
-        patient = Patient(wallet_address=wallet_address)
-        db.add(patient)
-        db.flush()
-
         # generate study ID like CT-2025-0001
-        year = datetime.now().year
-        padded = str(patient.id).zfill(4)
-        patient.study_id = f"CT-{year}-{padded}"
+        study_id, = allocate_study_ids(db, 1)
+        patient = Patient(wallet_address=wallet_address, study_id=study_id)
         patient.created_at = datetime.now()
+        db.add(patient)
 
     # save PDF
     file_bytes = await file.read()
@@ -127,6 +130,30 @@ async def save_patient_basic_info(
     }
 
 
+# ============================================================
+# POST: bulk onboarding (CSV / NDJSON + optional zip of records)
+# ============================================================
+
+@router.post("/patients/bulk-import")
+def bulk_import_patients(
+    file: UploadFile = File(...),
+    records: UploadFile = File(None),
+    format: str = Form(None),
+    db: Session = Depends(get_db),
+):
+    fmt = format or detect_format(file.filename)
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(400, "format must be csv or ndjson")
+
+    try:
+        return import_patients(
+            db, file.file, fmt,
+            records_stream=records.file if records is not None else None,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
 # ============================================================
 # Consent grant / revoke
 # ============================================================
@@ -139,17 +166,20 @@ def grant_consent(data: dict, db: Session = Depends(get_db)):
     if not wallet or not tx_hash:
         raise HTTPException(400, "wallet_address and tx_hash required")
 
-    stmt = select(Patient).where(Patient.wallet_address == wallet)
-    patient = db.execute(stmt).scalar_one_or_none()
+    cached = cache.get("consent/grant", wallet, tx_hash)
+    if cached is not None:
+        return cached
 
-    if not patient:
+    try:
+        event = apply_consent(db, wallet, True, tx_hash)
+    except TxHashConflict:
+        raise HTTPException(409, "tx_hash already used by another consent change")
+    if event is None:
         raise HTTPException(404, "Patient not found")
 
-    patient.authorized = True
-    patient.updated_at = datetime.now()
-    db.commit()
-
-    return {"status": "granted", "tx_hash": tx_hash}
+    response = {"status": "granted", "tx_hash": tx_hash}
+    cache.put("consent/grant", wallet, tx_hash, response)
+    return response
 
 
 @router.post("/patient/consent/revoke")
@@ -160,17 +190,20 @@ def revoke_consent(data: dict, db: Session = Depends(get_db)):
     if not wallet or not tx_hash:
         raise HTTPException(400, "wallet_address and tx_hash required")
 
-    stmt = select(Patient).where(Patient.wallet_address == wallet)
-    patient = db.execute(stmt).scalar_one_or_none()
+    cached = cache.get("consent/revoke", wallet, tx_hash)
+    if cached is not None:
+        return cached
 
-    if not patient:
+    try:
+        event = apply_consent(db, wallet, False, tx_hash)
+    except TxHashConflict:
+        raise HTTPException(409, "tx_hash already used by another consent change")
+    if event is None:
         raise HTTPException(404, "Patient not found")
 
-    patient.authorized = False
-    patient.updated_at = datetime.now()
-    db.commit()
-
-    return {"status": "revoked", "tx_hash": tx_hash}
+    response = {"status": "revoked", "tx_hash": tx_hash}
+    cache.put("consent/revoke", wallet, tx_hash, response)
+    return response
 
 
 @router.get("/patient/consent/status/{wallet}")
@@ -199,33 +232,28 @@ def create_self_report(data: dict, db: Session = Depends(get_db)):
     if not wallet or not content_hash or not tx_hash:
         raise HTTPException(400, "wallet_address, content_hash, tx_hash required")
 
-    stmt = select(Patient).where(Patient.wallet_address == wallet)
-    patient = db.execute(stmt).scalar_one_or_none()
+    cached = cache.get("self-report", wallet, tx_hash)
+    if cached is not None:
+        return cached
 
-    if not patient:
+    try:
+        report = insert_self_report(
+            db, wallet, symptoms, medication_compliance, content_hash, tx_hash,
+        )
+    except TxHashConflict:
+        raise HTTPException(409, "tx_hash already used by another report")
+    if report is None:
         raise HTTPException(404, f"Patient {wallet} not found")
 
-    report = SelfReport(
-        patient_id=patient.id,
-        symptoms=symptoms,
-        medication_compliance=medication_compliance,
-        content_hash=content_hash,
-        tx_hash=tx_hash,
-        created_at=datetime.now(),
-        updated_at=datetime.now(),
-    )
-
-    db.add(report)
-    db.commit()
-    db.refresh(report)
-
-    return {
+    response = {
         "id": report.id,
         "created_at": report.created_at,
         "symptoms": report.symptoms,
         "content_hash": report.content_hash,
         "tx_hash": report.tx_hash,
     }
+    cache.put("self-report", wallet, tx_hash, response)
+    return response
 
 
 # ============================================================
@@ -242,24 +270,20 @@ def record_access(data: dict, db: Session = Depends(get_db)):
     if not study_id or not hospital_wallet or not tx_hash:
         raise HTTPException(400, "study_id, hospital_wallet, tx_hash required")
 
-    stmt = select(Patient).where(Patient.study_id == study_id)
-    patient = db.execute(stmt).scalar_one_or_none()
-    if not patient:
-        raise HTTPException(404, "Patient not found")
-
-    log = AccessLog(
-        hospital_wallet=hospital_wallet,
-        patient_id=patient.id,
-        purpose=purpose,
-        chain_timestamp=datetime.utcnow(),
-        tx_hash=tx_hash,
-    )
+    cached = cache.get("access-log", f"{study_id}:{hospital_wallet}", tx_hash)
+    if cached is not None:
+        return cached
 
-    db.add(log)
-    db.commit()
-    db.refresh(log)
+    try:
+        log_id = insert_access_log(db, study_id, hospital_wallet, purpose, tx_hash)
+    except TxHashConflict:
+        raise HTTPException(409, "tx_hash already used by another access log")
+    if log_id is None:
+        raise HTTPException(404, "Patient not found")
 
-    return {"status": "logged", "log_id": log.id, "tx_hash": tx_hash}
+    response = {"status": "logged", "log_id": log_id, "tx_hash": tx_hash}
+    cache.put("access-log", f"{study_id}:{hospital_wallet}", tx_hash, response)
+    return response
 
 
 # ============================================================
@@ -320,11 +344,16 @@ def get_patient_wallet(study_id: str, db: Session = Depends(get_db)):
 # ============================================================
 
 @router.get("/access-logs")
-def get_access_logs(db: Session = Depends(get_db)):
-    stmt = (
-        select(AccessLog)
-        .order_by(AccessLog.db_timestamp.desc())
-    )
+def get_access_logs(days: int = None, db: Session = Depends(get_read_db)):
+    # by default everything not yet archived (older rows: /access-logs/archive),
+    # so only the partitions still attached are scanned
+    if days is None:
+        since = archived_until()
+    else:
+        since = datetime.utcnow() - timedelta(days=days)
+    stmt = select(AccessLog).order_by(AccessLog.db_timestamp.desc())
+    if since is not None:
+        stmt = stmt.where(AccessLog.db_timestamp >= since)
     logs = db.execute(stmt).scalars().all()
 
     return {
@@ -343,13 +372,53 @@ def get_access_logs(db: Session = Depends(get_db)):
     }
 
 
+# ============================================================
+# Query archived (cold) access logs
+# ============================================================
+
+def _naive_utc(d: datetime) -> datetime:
+    # archived timestamps are naive UTC, like the db_timestamp column
+    if d.tzinfo is None:
+        return d
+    return d.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@router.get("/access-logs/archive")
+def get_archived_access_logs(start: datetime, end: datetime, db: Session = Depends(get_read_db)):
+    try:
+        rows = query_archive(_naive_utc(start), _naive_utc(end))
+    except ValueError as e:
+        raise HTTPException(500, str(e))
+
+    patient_ids = {r["patient_id"] for r in rows}
+    study_ids = {}
+    if patient_ids:
+        stmt = select(Patient.id, Patient.study_id).where(Patient.id.in_(patient_ids))
+        study_ids = dict(db.execute(stmt).all())
+
+    return {
+        "logs": [
+            {
+                "id": r["id"],
+                "hospital_wallet": r["hospital_wallet"],
+                "study_id": study_ids.get(r["patient_id"]),
+                "purpose": r["purpose"],
+                "tx_hash": r["tx_hash"],
+                "chain_timestamp": r["chain_timestamp"],
+                "db_timestamp": r["db_timestamp"],
+            }
+            for r in rows
+        ]
+    }
+
+
 # ============================================================
 # Dashboard Analytics API
 # ============================================================
 
 # 1. Enrollment trend (monthly new patients)
 @router.get("/stats/enrollment-trend")
-def enrollment_trend(db: Session = Depends(get_db)):
+def enrollment_trend(db: Session = Depends(get_read_db)):
     stmt = (
         select(
             func.date_trunc("month", Patient.created_at).label("month"),
@@ -370,7 +439,7 @@ def enrollment_trend(db: Session = Depends(get_db)):
 
 # 2. Symptom distribution
 @router.get("/stats/symptoms")
-def symptom_distribution(db: Session = Depends(get_db)):
+def symptom_distribution(db: Session = Depends(get_read_db)):
     stmt = select(SelfReport.symptoms)
     rows = db.execute(stmt).scalars().all()
 
@@ -386,7 +455,7 @@ def symptom_distribution(db: Session = Depends(get_db)):
 
 # 3. Medication adherence stats
 @router.get("/stats/adherence")
-def adherence_stats(db: Session = Depends(get_db)):
+def adherence_stats(db: Session = Depends(get_read_db)):
     total = db.query(SelfReport).count()
     compliant = db.query(SelfReport).filter(SelfReport.medication_compliance == True).count()
     non_compliant = total - compliant
@@ -401,7 +470,7 @@ def adherence_stats(db: Session = Depends(get_db)):
 
 # 4. Severe adverse events (severity >= 4)
 @router.get("/stats/severe-events")
-def severe_events(db: Session = Depends(get_db)):
+def severe_events(db: Session = Depends(get_read_db)):
     stmt = select(SelfReport.symptoms)
     rows = db.execute(stmt).scalars().all()
 
@@ -417,7 +486,7 @@ def severe_events(db: Session = Depends(get_db)):
 
 # 5. Summary cards (top KPI)
 @router.get("/stats/summary")
-def summary_stats(db: Session = Depends(get_db)):
+def summary_stats(db: Session = Depends(get_read_db)):
     total_patients = db.query(Patient).count()
     total_reports = db.query(SelfReport).count()
     compliant = db.query(SelfReport).filter(SelfReport.medication_compliance == True).count()
@@ -438,3 +507,31 @@ def summary_stats(db: Session = Depends(get_db)):
         "adherence_rate": compliant / total_reports if total_reports else 0,
         "severe_events": severe,
     }
+
+
+# ============================================================
+# Cohort Analytics API (served from the columnar snapshot)
+# ============================================================
+
+# 6. Adherence rate by study week
+@router.get("/stats/cohort/adherence-by-week")
+def cohort_adherence_by_week(db: Session = Depends(get_read_db)):
+    snapshot = get_cohort_snapshot(db)
+    return {"items": snapshot.adherence_by_week()}
+
+
+# 7. Severity histogram by age band and gender
+@router.get("/stats/cohort/severity-histogram")
+def cohort_severity_histogram(age_band: int = 10, db: Session = Depends(get_read_db)):
+    if age_band <= 0:
+        raise HTTPException(400, "age_band must be positive")
+
+    snapshot = get_cohort_snapshot(db)
+    return {"items": snapshot.severity_histogram(age_band)}
+
+
+# 8. Time from enrollment to first severe event
+@router.get("/stats/cohort/time-to-severe")
+def cohort_time_to_severe(db: Session = Depends(get_read_db)):
+    snapshot = get_cohort_snapshot(db)
+    return snapshot.time_to_first_severe()
@@ -0,0 +1,65 @@
+# backend/app/study_ids.py
+import threading
+from datetime import datetime
+
+from sqlalchemy import Integer, cast, func, select, text
+from sqlalchemy.orm import Session
+
+from app.models import Patient, study_id_seq
+
+_lock = threading.Lock()
+_next_local = 0
+
+
+def format_study_id(number: int, year: int = None) -> str:
+    # e.g. CT-2025-0001
+    year = year or datetime.now().year
+    return f"CT-{year}-{str(number).zfill(4)}"
+
+
+def sync_study_id_sequence(db: Session):
+    """
+    Move the sequence past numbers already handed out, which were derived
+    from patients.id before the sequence existed. On an empty database the
+    sequence is left to start at 1.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    seq = study_id_seq.name
+    db.execute(text(
+        f"SELECT setval('{seq}', GREATEST(n, 1), n > 0) FROM ("
+        f"SELECT GREATEST("
+        f"CASE WHEN is_called THEN last_value ELSE last_value - 1 END, "
+        f"(SELECT COALESCE(MAX(id), 0) FROM patients)) AS n "
+        f"FROM {seq}) used"
+    ))
+    db.commit()
+
+
+def allocate_study_numbers(db: Session, n: int) -> list:
+    """Reserve `n` study numbers in one round trip."""
+    if n <= 0:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = select(study_id_seq.next_value()).select_from(func.generate_series(1, n))
+        return list(db.execute(stmt).scalars().all())
+
+    # No sequences (SQLite): hand out blocks from a process-local counter
+    # seeded from the highest number in use. Only safe with a single writer.
+    global _next_local
+    with _lock:
+        # "CT-2025-" is 8 characters; the number starts at position 9
+        stmt = select(
+            func.coalesce(func.max(Patient.id), 0),
+            func.coalesce(func.max(cast(func.substr(Patient.study_id, 9), Integer)), 0),
+        )
+        max_id, max_number = db.execute(stmt).one()
+        start = max(_next_local, max_id + 1, max_number + 1)
+        _next_local = start + n
+    return list(range(start, start + n))
+
+
+def allocate_study_ids(db: Session, n: int) -> list:
+    year = datetime.now().year
+    return [format_study_id(number, year) for number in allocate_study_numbers(db, n)]
@@ -7,11 +7,12 @@ load_dotenv()
 
 RPC_URL = os.getenv("RPC_URL")
 CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
+CONTRACT_ABI_PATH = os.getenv("CONTRACT_ABI_PATH", "contract_abi.json")
 
 w3 = Web3(Web3.HTTPProvider(RPC_URL))
 
 # Load ABI
-with open("contract_abi.json", "r") as f:
+with open(CONTRACT_ABI_PATH, "r") as f:
     ABI = json.load(f)
 
 def get_contract():
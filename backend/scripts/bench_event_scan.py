@@ -0,0 +1,149 @@
+# backend/scripts/bench_event_scan.py
+"""
+Benchmark the chain-facing event scans against the local replay node
+(app.rpc_replay) instead of a live RPC_URL.
+
+Two scans are measured:
+  * per-patient: web3util.get_data_access() for a sample of patients
+    (one full-range filter per patient, as the app does today)
+  * full history: eth_getLogs over the contract in fixed block chunks,
+    retrying injected failures, decoding every event (--scan-blocks limits
+    it to a prefix of the chain; most of its time is web3's log formatting)
+
+For each scan it reports logs/s, the number of RPC calls per method and any
+errors. Run from backend/:
+
+    python scripts/bench_event_scan.py --logs 1000000 --max-block-range 5000
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import time
+
+BACKEND = pathlib.Path(__file__).resolve().parent.parent
+ABI_PATH = BACKEND.parent / "frontend" / "src" / "abi" / "ClinicalTrialRegistry.json"
+sys.path.insert(0, str(BACKEND))
+
+from app.rpc_replay import EVENTS_BY_TOPIC, add_arguments, build_server  # noqa: E402
+
+
+def _scan_per_patient(server, web3util, sample: int) -> dict:
+    history = server.history
+    step = max(history.n_patients // sample, 1)
+    patients = history.patients[::step][:sample]
+
+    logs, errors = 0, []
+    start = time.perf_counter()
+    for patient in patients:
+        try:
+            logs += len(web3util.get_data_access(patient))
+        except Exception as e:
+            errors.append(str(e))
+    elapsed = time.perf_counter() - start
+    return {"patients": len(patients), "logs": logs, "seconds": elapsed, "errors": errors}
+
+
+def _with_retries(call, retries: int):
+    """Run `call`, retrying failed RPCs; returns (result, failed attempts)."""
+    for attempt in range(retries + 1):
+        try:
+            return call(), attempt
+        except Exception:
+            if attempt == retries:
+                raise
+
+
+def _scan_full_history(server, web3util, chunk: int, retries: int, scan_blocks: int) -> dict:
+    w3 = web3util.w3
+    contract = web3util.get_contract()
+    events = {topic: getattr(contract.events, name)() for topic, name in EVENTS_BY_TOPIC.items()}
+
+    head, failures = _with_retries(lambda: w3.eth.block_number, retries)
+    if scan_blocks is not None:
+        head = min(head, scan_blocks - 1)
+    logs, errors = 0, []
+    start = time.perf_counter()
+    for from_block in range(0, head + 1, chunk):
+        to_block = min(from_block + chunk - 1, head)
+        criteria = {"address": contract.address, "fromBlock": from_block, "toBlock": to_block}
+        try:
+            raw, failed = _with_retries(lambda: w3.eth.get_logs(criteria), retries)
+        except Exception as e:
+            failures += retries + 1
+            errors.append(f"blocks {from_block}-{to_block}: {e}")
+            continue
+        failures += failed
+        for entry in raw:
+            topic = "0x" + bytes(entry["topics"][0]).hex()
+            events[topic].process_log(entry)
+        logs += len(raw)
+    elapsed = time.perf_counter() - start
+    return {
+        "blocks": head + 1, "chunk": chunk, "logs": logs, "seconds": elapsed,
+        "failed_calls": failures, "errors": errors,
+    }
+
+
+def _report(name: str, result: dict, calls: dict):
+    seconds = result["seconds"]
+    rate = result["logs"] / seconds if seconds else 0
+    print(f"\n{name}")
+    print(f"  logs: {result['logs']}  time: {seconds:.3f}s  throughput: {rate:,.0f} logs/s")
+    print(f"  rpc calls: {sum(calls.values())} {dict(sorted(calls.items()))}")
+    if result.get("failed_calls"):
+        print(f"  retried calls: {result['failed_calls']}")
+    if result["errors"]:
+        print(f"  errors: {len(result['errors'])} (first: {result['errors'][0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-scan benchmark on a synthetic chain")
+    add_arguments(parser)
+    parser.add_argument("--chunk", type=int, default=2000, help="blocks per eth_getLogs call")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--sample-patients", type=int, default=20)
+    parser.add_argument("--scan-blocks", type=int, default=None,
+                        help="limit the full-history scan to the first N blocks")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    server = build_server(args)
+    server.start()
+
+    # web3util reads its configuration at import time
+    os.environ["RPC_URL"] = server.url
+    os.environ["CONTRACT_ADDRESS"] = server.history.contract_address
+    os.environ["CONTRACT_ABI_PATH"] = str(ABI_PATH)
+    from app import web3util
+
+    results = {}
+    for name, scan in (
+        ("per_patient", lambda: _scan_per_patient(server, web3util, args.sample_patients)),
+        ("full_history", lambda: _scan_full_history(
+            server, web3util, args.chunk, args.retries, args.scan_blocks,
+        )),
+    ):
+        server.rpc_replay_resetStats()
+        result = scan()
+        result["rpc_calls"] = server.rpc_replay_stats()
+        results[name] = result
+
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    history = server.history
+    print(
+        f"history: {history.n_logs} logs, {history.n_patients} patients, "
+        f"{history.head_block + 1} blocks"
+    )
+    for name, result in results.items():
+        _report(name, result, result["rpc_calls"])
+
+
+if __name__ == "__main__":
+    main()
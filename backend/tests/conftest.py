@@ -0,0 +1,54 @@
+# backend/tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time, and serves ./uploads,
+# so point everything at a scratch directory before importing it.
+_WORKDIR = tempfile.mkdtemp(prefix="clinical-tests-")
+os.makedirs(os.path.join(_WORKDIR, "uploads"), exist_ok=True)
+os.chdir(_WORKDIR)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_WORKDIR, 'test.sqlite3')}"
+os.environ["ACCESS_LOG_ARCHIVE_DIR"] = os.path.join(_WORKDIR, "archive")
+os.environ["ANALYTICS_REFRESH_SECONDS"] = "0"
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import analytics, idempotency, study_ids  # noqa: E402
+from app.db import engine, SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Base, Patient  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    idempotency.cache._entries.clear()
+    analytics._snapshot.invalidate()
+    study_ids._next_local = 0
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_patient(db):
+    def make(wallet, study_id=None, **fields):
+        patient = Patient(wallet_address=wallet, study_id=study_id, **fields)
+        db.add(patient)
+        db.commit()
+        return patient
+    return make
@@ -0,0 +1,98 @@
+# backend/tests/test_analytics.py
+from datetime import datetime, timedelta
+
+from app.analytics import CohortSnapshot
+from app.models import SelfReport
+
+T0 = datetime(2025, 1, 1)
+
+
+def _report(patient_id, day, severity, compliant=True, **fields):
+    return SelfReport(
+        patient_id=patient_id,
+        symptoms=[{"symptom": "nausea", "severity": severity}],
+        medication_compliance=compliant,
+        created_at=T0 + timedelta(days=day),
+        updated_at=T0,
+        **fields,
+    )
+
+
+def test_stratified_queries(db, make_patient):
+    p1 = make_patient("w1", age=34, gender="F", created_at=T0, updated_at=T0)
+    p2 = make_patient("w2", age=61, gender="M", created_at=T0, updated_at=T0)
+    db.add_all([
+        _report(p1.id, 0, 1, True),
+        _report(p1.id, 3, 5, False),
+        _report(p2.id, 8, 2, True),
+        _report(p2.id, 10, 4, True),
+    ])
+    db.commit()
+
+    snapshot = CohortSnapshot().refresh(db, force=True)
+
+    assert snapshot.adherence_by_week() == [
+        {"week": 0, "total": 2, "compliant": 1, "rate": 0.5},
+        {"week": 1, "total": 2, "compliant": 2, "rate": 1.0},
+    ]
+    histogram = {
+        (h["age_band"], h["gender"], h["severity"]): h["count"]
+        for h in snapshot.severity_histogram()
+    }
+    assert histogram == {
+        ("30-39", "F", 1): 1, ("30-39", "F", 5): 1,
+        ("60-69", "M", 2): 1, ("60-69", "M", 4): 1,
+    }
+    severe = snapshot.time_to_first_severe()
+    assert severe["patients_with_event"] == 2
+    assert severe["median_days"] == 6.5
+
+
+def test_refresh_picks_up_reports_committed_out_of_order(db, make_patient):
+    p = make_patient("w1", age=30, gender="F", created_at=T0, updated_at=T0)
+    db.add_all([_report(p.id, 0, 1, id=1), _report(p.id, 1, 1, id=3)])
+    db.commit()
+
+    snapshot = CohortSnapshot().refresh(db, force=True)
+    assert snapshot.report_hwm == 3
+
+    # id 2 becomes visible only after id 3 was already loaded
+    db.add(_report(p.id, 2, 5, id=2))
+    db.commit()
+    snapshot.refresh(db, force=True)
+
+    assert sorted(snapshot.report_id.tolist()) == [1, 2, 3]
+    assert snapshot.time_to_first_severe()["patients_with_event"] == 1
+
+    # re-reading the overlap window doesn't duplicate rows
+    snapshot.refresh(db, force=True)
+    assert len(snapshot.report_id) == 3
+
+
+def test_refresh_picks_up_patients_committed_out_of_order(db, make_patient):
+    make_patient("w1", age=30, gender="F", created_at=T0, updated_at=T0 + timedelta(minutes=2))
+    snapshot = CohortSnapshot().refresh(db, force=True)
+
+    # stamped before w1 but committed after it was loaded
+    late = make_patient("w2", age=50, gender="M", created_at=T0, updated_at=T0 + timedelta(minutes=1))
+    db.add(_report(late.id, 1, 5))
+    db.commit()
+    snapshot.refresh(db, force=True)
+
+    assert late.id in snapshot.patient_id.tolist()
+    assert snapshot.time_to_first_severe()["patients_with_event"] == 1
+
+
+def test_refresh_loads_unknown_patients_of_new_reports(db, make_patient, monkeypatch):
+    monkeypatch.setattr("app.analytics.PATIENT_OVERLAP_SECONDS", 0)
+    make_patient("w1", age=30, gender="F", created_at=T0, updated_at=T0 + timedelta(days=1))
+    snapshot = CohortSnapshot().refresh(db, force=True)
+
+    # older than the overlap window; only reachable through its report
+    late = make_patient("w2", age=50, gender="M", created_at=T0, updated_at=T0)
+    db.add(_report(late.id, 1, 5))
+    db.commit()
+    snapshot.refresh(db, force=True)
+
+    assert late.id in snapshot.patient_id.tolist()
+    assert snapshot.time_to_first_severe()["patients_with_event"] == 1
@@ -0,0 +1,131 @@
+# backend/tests/test_bulk_import.py
+import hashlib
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from app.bulk_import import UPLOAD_DIR, import_patients
+from app.models import Patient
+
+
+def _ndjson(*rows) -> io.BytesIO:
+    return io.BytesIO("".join(
+        (r if isinstance(r, str) else json.dumps(r)) + "\n" for r in rows
+    ).encode())
+
+
+def _zip(**members) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def _record_path(wallet):
+    return os.path.join(UPLOAD_DIR, f"{wallet}_initial_record.pdf")
+
+
+def test_invalid_rows_are_reported_per_row(client, db):
+    summary = import_patients(db, _ndjson(
+        {"wallet_address": "w1", "age": 40, "gender": "F"},
+        [1, 2],
+        {"wallet_address": 5},
+        {"wallet_address": "w2", "gender": 3},
+        "{not json",
+        {"wallet_address": "w3"},
+    ), "ndjson")
+
+    assert summary["rows"] == 6
+    assert summary["created"] == 2
+    assert [e["row"] for e in summary["errors"]] == [2, 3, 4, 5]
+    assert sorted(db.query(Patient.wallet_address).all()) == [("w1",), ("w3",)]
+
+
+def test_first_study_id_is_one(client, db):
+    import_patients(db, _ndjson({"wallet_address": "w1"}), "ndjson")
+    assert db.query(Patient.study_id).scalar() == f"CT-{datetime.now().year}-0001"
+
+
+def test_upload_with_non_zip_records_is_rejected(client, db):
+    resp = client.post(
+        "/patients/bulk-import",
+        files={
+            "file": ("cohort.csv", b"wallet_address,age\nw1,40\n"),
+            "records": ("records.zip", b"not a zip"),
+        },
+    )
+    assert resp.status_code == 400
+    assert db.query(Patient).count() == 0
+
+
+def test_corrupt_record_is_a_row_error(client, db):
+    records = _zip(**{"a.pdf": b"A" * 1000})
+    raw = bytearray(records.getvalue())
+    raw[raw.index(b"A" * 100)] ^= 0xFF  # breaks the CRC
+    summary = import_patients(db, _ndjson(
+        {"wallet_address": "w1", "record_file": "a.pdf", "tx_hash": "0x1"},
+        {"wallet_address": "w2"},
+    ), "ndjson", records_stream=io.BytesIO(bytes(raw)))
+
+    assert summary["created"] == 1
+    assert [e["row"] for e in summary["errors"]] == [1]
+
+
+def test_record_fields_are_replaced_together(client, db, make_patient):
+    make_patient(
+        "w1", study_id="CT-2025-0001",
+        initial_record_url="old-url", initial_record_hash="old-hash",
+        initial_record_tx_hash="0xold",
+    )
+
+    # a new record without a tx_hash must not keep the old tx
+    import_patients(db, _ndjson(
+        {"wallet_address": "w1", "record_file": "a.pdf"},
+        {"wallet_address": "w2", "record_file": "b.pdf", "tx_hash": "0xb"},
+    ), "ndjson", records_stream=_zip(**{"a.pdf": b"new", "b.pdf": b"b"}))
+    db.expire_all()
+    p = db.query(Patient).filter_by(wallet_address="w1").one()
+    assert p.initial_record_hash == hashlib.sha256(b"new").hexdigest()
+    assert p.initial_record_tx_hash is None
+
+    # a row without a record keeps the stored one
+    import_patients(db, _ndjson(
+        {"wallet_address": "w1", "age": 50},
+        {"wallet_address": "w2", "record_file": "b.pdf", "tx_hash": "0xb"},
+    ), "ndjson", records_stream=_zip(**{"b.pdf": b"b"}))
+    db.expire_all()
+    p = db.query(Patient).filter_by(wallet_address="w1").one()
+    assert (p.age, p.initial_record_hash) == (50, hashlib.sha256(b"new").hexdigest())
+
+
+def test_record_file_replaced_only_after_commit(client, db, make_patient, monkeypatch):
+    make_patient("w1", study_id="CT-2025-0001")
+    import_patients(db, _ndjson({"wallet_address": "w1", "record_file": "a.pdf"}),
+                    "ndjson", records_stream=_zip(**{"a.pdf": b"v1"}))
+    with open(_record_path("w1"), "rb") as f:
+        assert f.read() == b"v1"
+
+    def fail():
+        raise RuntimeError("commit failed")
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        import_patients(db, _ndjson({"wallet_address": "w1", "record_file": "a.pdf"}),
+                        "ndjson", records_stream=_zip(**{"a.pdf": b"v2"}))
+
+    with open(_record_path("w1"), "rb") as f:
+        assert f.read() == b"v1"
+    assert not [n for n in os.listdir(UPLOAD_DIR) if n.endswith(".tmp")]
+
+
+def test_csv_with_byte_order_mark(client, db):
+    csv_data = "wallet_address,age,gender\r\nw1,40,F\r\n".encode("utf-8-sig")
+    summary = import_patients(db, io.BytesIO(csv_data), "csv")
+
+    assert summary["errors"] == []
+    assert db.query(Patient.wallet_address, Patient.age).all() == [("w1", 40)]
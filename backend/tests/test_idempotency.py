@@ -0,0 +1,155 @@
+# backend/tests/test_idempotency.py
+from sqlalchemy import text
+
+from app import idempotency
+from app.db import engine
+from app.idempotency import IdempotencyCache, migrate
+from app.models import AccessLog, ConsentEvent, SelfReport
+
+
+def _report(wallet, tx_hash, **fields):
+    return {
+        "wallet_address": wallet, "symptoms": [{"symptom": "nausea", "severity": 2}],
+        "medication_compliance": True, "content_hash": "0xcontent", "tx_hash": tx_hash,
+        **fields,
+    }
+
+
+def _access(study_id, tx_hash, hospital_wallet="0xhospital"):
+    return {"study_id": study_id, "hospital_wallet": hospital_wallet,
+            "purpose": "audit", "tx_hash": tx_hash}
+
+
+def test_repeated_self_report_returns_stored_row(client, db, make_patient):
+    make_patient("w1", study_id="CT-2025-0001")
+
+    first = client.post("/self-report/submit", json=_report("w1", "0x1"))
+    idempotency.cache._entries.clear()  # force the database path
+    again = client.post("/self-report/submit", json=_report("w1", "0x1", content_hash="0xother"))
+
+    assert first.status_code == again.status_code == 200
+    assert again.json() == first.json()
+    assert db.query(SelfReport).count() == 1
+
+
+def test_self_report_tx_hash_of_another_wallet(client, db, make_patient):
+    make_patient("w1", study_id="CT-2025-0001")
+    make_patient("w2", study_id="CT-2025-0002")
+    assert client.post("/self-report/submit", json=_report("w1", "0x1")).status_code == 200
+
+    # neither the cache nor the database hands w1's report to w2
+    resp = client.post("/self-report/submit", json=_report("w2", "0x1"))
+    assert resp.status_code == 409
+    idempotency.cache._entries.clear()
+    resp = client.post("/self-report/submit", json=_report("w2", "0x1"))
+    assert resp.status_code == 409
+
+    resp = client.post("/self-report/submit", json=_report("unknown", "0x1"))
+    assert resp.status_code == 404
+    assert db.query(SelfReport).count() == 1
+
+
+def test_unknown_patient_does_not_burn_tx_hash(client, make_patient):
+    resp = client.post("/self-report/submit", json=_report("w1", "0x1"))
+    assert resp.status_code == 404
+    resp = client.post("/access-log", json=_access("CT-2025-0001", "0x2"))
+    assert resp.status_code == 404
+    consent = {"wallet_address": "w1", "tx_hash": "0x3"}
+    assert client.post("/patient/consent/grant", json=consent).status_code == 404
+
+    make_patient("w1", study_id="CT-2025-0001")
+    assert client.post("/self-report/submit", json=_report("w1", "0x1")).status_code == 200
+    assert client.post("/access-log", json=_access("CT-2025-0001", "0x2")).status_code == 200
+    assert client.post("/patient/consent/grant", json=consent).status_code == 200
+
+
+def test_access_log_repeat_and_conflict(client, db, make_patient):
+    make_patient("w1", study_id="CT-2025-0001")
+    make_patient("w2", study_id="CT-2025-0002")
+
+    first = client.post("/access-log", json=_access("CT-2025-0001", "0x1"))
+    idempotency.cache._entries.clear()
+    again = client.post("/access-log", json=_access("CT-2025-0001", "0x1"))
+    assert again.status_code == 200
+    assert again.json()["log_id"] == first.json()["log_id"]
+
+    assert client.post("/access-log", json=_access("CT-2025-0002", "0x1")).status_code == 409
+    resp = client.post("/access-log", json=_access("CT-2025-0001", "0x1", "0xother"))
+    assert resp.status_code == 409
+    assert db.query(AccessLog).count() == 1
+
+
+def test_consent_repeat(client, make_patient):
+    make_patient("w1", study_id="CT-2025-0001")
+    body = {"wallet_address": "w1", "tx_hash": "0x1"}
+
+    assert client.post("/patient/consent/grant", json=body).json() == {
+        "status": "granted", "tx_hash": "0x1",
+    }
+    assert client.post("/patient/consent/grant", json=body).status_code == 200
+    # the cached response is not served for another wallet
+    resp = client.post("/patient/consent/grant", json={"wallet_address": "w2", "tx_hash": "0x1"})
+    assert resp.status_code == 404
+
+
+def test_stale_consent_retry_does_not_undo_a_revoke(client, db, make_patient):
+    make_patient("w1", study_id="CT-2025-0001", authorized=False)
+    make_patient("w2", study_id="CT-2025-0002")
+    grant = {"wallet_address": "w1", "tx_hash": "0xg"}
+
+    assert client.post("/patient/consent/grant", json=grant).status_code == 200
+    assert client.post("/patient/consent/revoke", json={
+        "wallet_address": "w1", "tx_hash": "0xr",
+    }).status_code == 200
+
+    # the cache has expired (or another worker gets the retry)
+    idempotency.cache._entries.clear()
+    resp = client.post("/patient/consent/grant", json=grant)
+    assert resp.json() == {"status": "granted", "tx_hash": "0xg"}
+    assert client.get("/patient/consent/status/w1").json()["authorized"] is False
+    assert db.query(ConsentEvent).count() == 2
+
+    # the same tx_hash for another patient or the opposite action is refused
+    resp = client.post("/patient/consent/grant", json={"wallet_address": "w2", "tx_hash": "0xg"})
+    assert resp.status_code == 409
+    assert client.post("/patient/consent/revoke", json=grant).status_code == 409
+    assert client.get("/patient/consent/status/w2").json()["authorized"] is True
+
+
+def test_cache_expiry_and_eviction(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(idempotency.time, "monotonic", lambda: now[0])
+    cache = IdempotencyCache(ttl=10, max_entries=2)
+
+    cache.put("e", "w1", "0x1", 1)
+    cache.put("e", "w1", "0x2", 2)
+    assert cache.get("e", "w1", "0x1") == 1  # now most recently used
+    cache.put("e", "w1", "0x3", 3)
+    assert cache.get("e", "w1", "0x2") is None
+    assert cache.get("e", "w2", "0x1") is None
+
+    now[0] += 10
+    assert cache.get("e", "w1", "0x1") is None
+
+
+def test_migrate_dedupes_existing_rows(client, db, make_patient):
+    p = make_patient("w1", study_id="CT-2025-0001")
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_self_reports_tx_hash"))
+        conn.execute(text("DROP TABLE self_reports"))
+        conn.execute(text(
+            "CREATE TABLE self_reports (id INTEGER PRIMARY KEY, patient_id INTEGER, "
+            "symptoms JSON, medication_compliance BOOLEAN, content_hash VARCHAR, "
+            "tx_hash VARCHAR, created_at DATETIME, updated_at DATETIME)"
+        ))
+        for content_hash in ("0xa", "0xb"):
+            conn.execute(text(
+                "INSERT INTO self_reports (patient_id, content_hash, tx_hash) "
+                "VALUES (:p, :c, '0x1')"
+            ), {"p": p.id, "c": content_hash})
+
+    migrate(engine)
+    migrate(engine)  # rerunnable
+
+    assert [r.content_hash for r in db.query(SelfReport).all()] == ["0xa"]
+    assert client.post("/self-report/submit", json=_report("w1", "0x1")).json()["content_hash"] == "0xa"
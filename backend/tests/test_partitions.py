@@ -0,0 +1,111 @@
+# backend/tests/test_partitions.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import partitions
+from app.db import engine
+from app.models import AccessLog
+from app.partitions import add_months, archive_cold, load_manifest, month_start, query_archive
+
+NOW = datetime.utcnow()
+COLD = add_months(month_start(NOW), -(partitions.ARCHIVE_AFTER_MONTHS + 2))
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(partitions, "ARCHIVE_DIR", tmp_path)
+    return tmp_path
+
+
+def _log(patient, ts, tx_hash, **fields):
+    return AccessLog(
+        hospital_wallet="0xhospital", patient_id=patient.id, purpose="audit",
+        chain_timestamp=ts, db_timestamp=ts, tx_hash=tx_hash, **fields,
+    )
+
+
+def test_archive_and_query_back(client, db, make_patient):
+    p = make_patient("w1", study_id="CT-2025-0001")
+    db.add_all([
+        _log(p, COLD + timedelta(days=1), "0x1"),
+        _log(p, COLD + timedelta(days=40), "0x2"),
+        _log(p, NOW - timedelta(days=1), "0x3"),
+    ])
+    db.commit()
+
+    archived = archive_cold(engine)
+    assert [a["rows"] for a in archived] == [1, 1]
+    assert db.query(AccessLog).count() == 1
+
+    rows = query_archive(COLD, add_months(COLD, 2))
+    assert [r["tx_hash"] for r in rows] == ["0x2", "0x1"]
+
+    # timezone-aware bounds are compared as UTC
+    resp = client.get("/access-logs/archive", params={
+        "start": COLD.isoformat() + "+00:00",
+        "end": (COLD + timedelta(days=2)).isoformat() + "Z",
+    })
+    assert resp.status_code == 200
+    assert [(r["tx_hash"], r["study_id"]) for r in resp.json()["logs"]] == [("0x1", "CT-2025-0001")]
+
+
+def test_rerun_after_failed_drop_does_not_duplicate(client, db, make_patient, archive_dir):
+    p = make_patient("w1", study_id="CT-2025-0001")
+    db.add(_log(p, COLD + timedelta(days=1), "0x1", id=1))
+    db.commit()
+    archive_cold(engine)
+
+    # the drop failed: the archived row is still in the table
+    db.add(_log(p, COLD + timedelta(days=1), "0x1", id=1))
+    db.commit()
+    archive_cold(engine)
+
+    assert db.query(AccessLog).count() == 0
+    assert len(load_manifest()) == 1
+    assert [f.name for f in archive_dir.iterdir() if f.name != "manifest.json"] == [
+        f"access_logs_p{COLD:%Y_%m}.ndjson.gz",
+    ]
+
+    # a row that arrived later for the same month gets its own file
+    db.add(_log(p, COLD + timedelta(days=2), "0x2"))
+    db.commit()
+    archive_cold(engine)
+    assert [e["rows"] for e in load_manifest()] == [1, 1]
+    assert len(query_archive(COLD, add_months(COLD, 1))) == 2
+
+
+def test_access_logs_default_window_without_archive(client, db, make_patient):
+    p = make_patient("w1", study_id="CT-2025-0001")
+    db.add_all([
+        _log(p, NOW - timedelta(days=500), "0x1"),
+        _log(p, NOW - timedelta(days=1), "0x2"),
+    ])
+    db.commit()
+
+    # nothing archived yet: old rows are still served from the table
+    resp = client.get("/access-logs")
+    assert [r["tx_hash"] for r in resp.json()["logs"]] == ["0x2", "0x1"]
+
+    resp = client.get("/access-logs", params={"days": 30})
+    assert [r["tx_hash"] for r in resp.json()["logs"]] == ["0x2"]
+
+
+def test_access_logs_default_window_starts_after_archive(client, db, make_patient):
+    p = make_patient("w1", study_id="CT-2025-0001")
+    db.add_all([
+        _log(p, COLD + timedelta(days=1), "0x1"),
+        _log(p, NOW - timedelta(days=1), "0x2"),
+    ])
+    db.commit()
+    archive_cold(engine)
+
+    resp = client.get("/access-logs")
+    assert [r["tx_hash"] for r in resp.json()["logs"]] == ["0x2"]
+
+    # a late row for an archived month is served from the archive once the
+    # next archive run has picked it up
+    db.add(_log(p, COLD + timedelta(days=2), "0x3"))
+    db.commit()
+    archive_cold(engine)
+    assert [r["tx_hash"] for r in query_archive(COLD, add_months(COLD, 1))] == ["0x3", "0x1"]
@@ -0,0 +1,73 @@
+# backend/tests/test_read_replicas.py
+import pytest
+
+from app import db as db_module
+from app.db import DATABASE_URL, Replica
+
+
+@pytest.fixture
+def dead_replica(tmp_path, monkeypatch):
+    replica = Replica(f"sqlite:///{tmp_path / 'missing' / 'replica.sqlite3'}")
+    monkeypatch.setattr(db_module, "replicas", [replica])
+    return replica
+
+
+@pytest.fixture
+def live_replica(monkeypatch):
+    replica = Replica(DATABASE_URL)
+    replica.opened = 0
+    session_factory = replica.SessionLocal
+
+    def open_session():
+        replica.opened += 1
+        return session_factory()
+    monkeypatch.setattr(replica, "SessionLocal", open_session)
+    monkeypatch.setattr(db_module, "replicas", [replica])
+    return replica
+
+
+def test_unreachable_replica_falls_back_to_primary(client, make_patient, dead_replica):
+    make_patient("w1", study_id="CT-2025-0001")
+
+    resp = client.get("/patients")
+    assert resp.status_code == 200
+    assert [p["wallet_address"] for p in resp.json()["patients"]] == ["w1"]
+    assert not dead_replica.healthy()
+
+
+def test_unreachable_replica_falls_back_to_next_replica(client, make_patient, dead_replica,
+                                                        live_replica, monkeypatch):
+    monkeypatch.setattr(db_module, "replicas", [dead_replica, live_replica])
+    monkeypatch.setattr(db_module, "_next_replica", 0)
+    make_patient("w1", study_id="CT-2025-0001")
+
+    resp = client.get("/patients")
+    assert resp.status_code == 200
+    assert live_replica.opened == 1
+    assert not dead_replica.healthy()
+    assert live_replica.healthy()
+
+
+def test_reads_after_a_write_go_to_the_primary(client, make_patient, live_replica):
+    make_patient("w1", study_id="CT-2025-0001")
+
+    client.get("/patients")
+    assert live_replica.opened == 1
+
+    resp = client.post("/patient/consent/grant", json={"wallet_address": "w1", "tx_hash": "0x1"})
+    stamp = resp.headers[db_module.LAST_WRITE_HEADER]
+
+    # the cookie set by the write keeps this client on the primary
+    assert client.get("/patients").json()["patients"][0]["authorized"] is True
+    assert live_replica.opened == 1
+
+    # so does echoing the header, e.g. from another origin without cookies
+    client.cookies.clear()
+    client.get("/patients", headers={db_module.LAST_WRITE_HEADER: stamp})
+    assert live_replica.opened == 1
+
+    # other clients, and this one once the window has passed, use the replica
+    client.get("/patients")
+    stale = f"{float(stamp) - db_module.READ_YOUR_WRITES_SECONDS:.3f}"
+    client.get("/patients", headers={db_module.LAST_WRITE_HEADER: stale})
+    assert live_replica.opened == 3
@@ -0,0 +1,140 @@
+# backend/tests/test_rpc_replay.py
+import json
+import pathlib
+
+import pytest
+from web3 import Web3
+
+from app.rpc_replay import (
+    CONSENT_ACTIVE, CONSENT_NONE, CONSENT_REVOKED, EVENTS_BY_TOPIC,
+    Faults, ReplayServer, SyntheticHistory,
+)
+
+ABI_PATH = (
+    pathlib.Path(__file__).resolve().parents[2]
+    / "frontend" / "src" / "abi" / "ClinicalTrialRegistry.json"
+)
+
+N_LOGS = 2000
+N_PATIENTS = 13  # doesn't divide logs_per_block, so residue classes cross blocks
+
+
+@pytest.fixture
+def node():
+    servers = []
+
+    def start(**faults):
+        history = SyntheticHistory(N_LOGS, n_patients=N_PATIENTS, logs_per_block=7)
+        server = ReplayServer(("127.0.0.1", 0), history, Faults(**faults))
+        server.start()
+        servers.append(server)
+        w3 = Web3(Web3.HTTPProvider(server.url))
+        with open(ABI_PATH) as f:
+            contract = w3.eth.contract(
+                address=Web3.to_checksum_address(history.contract_address), abi=json.load(f),
+            )
+        return server, w3, contract
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _patient_topic(address):
+    return "0x" + "00" * 12 + address[2:]
+
+
+def _patient_logs(w3, contract, patient):
+    return w3.eth.get_logs({
+        "address": contract.address, "fromBlock": 0, "toBlock": "latest",
+        "topics": [None, _patient_topic(patient)],
+    })
+
+
+def _decode(contract, entry):
+    name = EVENTS_BY_TOPIC["0x" + bytes(entry["topics"][0]).hex()]
+    return getattr(contract.events, name)().process_log(entry)
+
+
+def test_patient_logs_in_block_order_and_decodable(node):
+    server, w3, contract = node()
+    history = server.history
+    patient = history.patients[5]
+
+    logs = _patient_logs(w3, contract, patient)
+    assert len(logs) == len(range(5, N_LOGS, N_PATIENTS))
+    blocks = [(entry["blockNumber"], entry["logIndex"]) for entry in logs]
+    assert blocks == sorted(blocks)
+
+    events = [_decode(contract, entry) for entry in logs]
+    assert events[0]["event"] == "ConsentGranted"
+    assert {e["args"]["patient"].lower() for e in events} == {patient}
+    accesses = [e for e in events if e["event"] == "DataAccess"]
+    assert accesses and all(e["args"]["accessor"].lower() == history.hospital_address for e in accesses)
+
+    # the accessor topic narrows to DataAccess events
+    only_access = w3.eth.get_logs({
+        "address": contract.address, "fromBlock": 0, "toBlock": "latest",
+        "topics": [None, _patient_topic(patient), _patient_topic(history.hospital_address)],
+    })
+    assert len(only_access) == len(accesses)
+
+
+def test_block_range_and_result_limits(node):
+    server, w3, _ = node(max_block_range=50, max_results=20)
+
+    resp = w3.provider.make_request("eth_getLogs", [{"fromBlock": "0x0", "toBlock": hex(50)}])
+    assert resp["error"]["code"] == -32005
+
+    # 21 blocks x 7 logs, within the range limit but over the result limit
+    resp = w3.provider.make_request("eth_getLogs", [{"fromBlock": "0x0", "toBlock": hex(20)}])
+    assert resp["error"]["code"] == -32005
+
+    resp = w3.provider.make_request("eth_getLogs", [{"fromBlock": "0x0", "toBlock": "0x1"}])
+    assert len(resp["result"]) == 14
+
+
+def test_patient_consent_matches_replayed_events(node):
+    server, w3, contract = node()
+    history = server.history
+
+    for patient in history.patients[:3]:
+        events = [
+            (entry["blockNumber"], _decode(contract, entry)["event"])
+            for entry in _patient_logs(w3, contract, patient)
+        ]
+        for block in range(0, history.head_block + 1, 7):
+            state = CONSENT_NONE
+            for event_block, name in events:
+                if event_block > block:
+                    break
+                if name == "ConsentGranted":
+                    state = CONSENT_ACTIVE
+                elif name == "ConsentRevoked":
+                    state = CONSENT_REVOKED
+            onchain = contract.functions.patientConsent(
+                Web3.to_checksum_address(patient)
+            ).call(block_identifier=block)
+            assert onchain == state, (patient, block)
+
+    # every consent state shows up somewhere in the history
+    head = history.head_block
+    states = {history.consent_at(p, b) for p in history.patients for b in range(0, head + 1, 3)}
+    assert states == {CONSENT_NONE, CONSENT_ACTIVE, CONSENT_REVOKED}
+
+
+def test_replay_stats_counts_calls(node):
+    server, w3, contract = node()
+    w3.provider.make_request("replay_resetStats", [])
+
+    w3.eth.block_number
+    w3.eth.block_number
+    _patient_logs(w3, contract, server.history.patients[0])
+    w3.provider.make_request("no_such_method", [])
+
+    stats = w3.provider.make_request("replay_stats", [])["result"]
+    assert stats["eth_blockNumber"] == 2
+    assert stats["eth_getLogs"] == 1
+    assert stats["no_such_method"] == 1
+    assert stats["replay_stats"] == 1
@@ -304,7 +304,7 @@ export default function Hospital() {
     const txHash = await callViewOnChain(patientWallet, purpose);
     if (!txHash) return;
 
-    await fetch(`${backend}/access-log`, {
+    const logRes = await fetch(`${backend}/access-log`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
@@ -315,7 +315,12 @@ export default function Hospital() {
       }),
     });
 
-    const logsRes = await fetch(`${backend}/access-logs`);
+    // echo the write time so this read is served by the primary, not a
+    // replica that may not have the new log yet
+    const lastWrite = logRes.headers.get("X-Last-Write");
+    const logsRes = await fetch(`${backend}/access-logs`, {
+      headers: lastWrite ? { "X-Last-Write": lastWrite } : {},
+    });
     const logs = await logsRes.json();
     setAccessLogs(logs.logs || []);
 